@@ -0,0 +1,102 @@
+import abc
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+class CacheStore(abc.ABC):
+    """
+    Interface for key-value stores used as cache, values are removed after their time to live (in seconds) if any.
+    """
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def delete(self, *keys: str):
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def clear(self):
+        raise NotImplementedError()
+
+
+def _sizeof(value: Any) -> int:
+    """
+    Returns the approximate size of a value in bytes, the length of bytes and strings is used as is.
+    """
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, (tuple, list)):
+        return sum(_sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class MemoryCacheStore(CacheStore):
+    """
+    In-process cache store evicting the least recently used entries above `max_size` entries or, if given, above
+    `max_bytes` bytes of values.
+
+    Values are kept as is, not copied.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = None, max_bytes: Optional[int] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, Tuple[Optional[float], int, Any]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the value stored for the key, None if missing or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        """
+        Stores a value for the key, the store ttl is used if none is given.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        self._remove(key)
+        size = _sizeof(value) if self.max_bytes is not None else 0
+        self._entries[key] = (time.monotonic() + ttl if ttl is not None else None, size, value)
+        self.bytes += size
+        while len(self._entries) > self.max_size or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    async def delete(self, *keys: str):
+        """
+        Removes the values stored for the keys.
+        """
+        for key in keys:
+            self._remove(key)
+
+    async def clear(self):
+        """
+        Removes all the values.
+        """
+        self._entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def __len__(self) -> int:
+        return len(self._entries)
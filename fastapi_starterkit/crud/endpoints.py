@@ -1,19 +1,27 @@
+import hashlib
 import inspect
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
 from enum import Enum
-from typing import TypeVar, Generic, List, get_args, Optional, Type, Any, Union
+from typing import TypeVar, Generic, List, get_args, Optional, Type, Any, Union, Callable, AsyncIterator, Dict
 
 from fastapi import status, Depends, HTTPException, Response, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from fastapi_starterkit.cache import CacheStore
 from fastapi_starterkit.crud.mapper import BaseMapper
-from fastapi_starterkit.crud.service import CRUDService, EntityNotFoundError
-from fastapi_starterkit.data.domain.pageable import PageRequest
+from fastapi_starterkit.crud.service import CRUDService, EntityNotFoundError, StaleEntityError
+from fastapi_starterkit.data.domain.filter import Filter, Criterion, Operator
+from fastapi_starterkit.data.domain.pageable import PageRequest, Cursor
 from fastapi_starterkit.data.domain.sort import Sort
 from fastapi_starterkit.utils import validate_type_arg
 from fastapi_starterkit.web.decorator import get, post, put, delete
-from fastapi_starterkit.web.dependencies import pageable_parameters, sort_parameters
+from fastapi_starterkit.web.dependencies import pageable_parameters, sort_parameters, cursor_parameters, \
+    filter_parameters, fields_parameters
+from fastapi_starterkit.web.encoder import json_dumps
 from fastapi_starterkit.web.rest import RestEndpoints
+from fastapi_starterkit.web.schema import SliceSchema
 
 READ_SCHEMA = TypeVar("READ_SCHEMA")
 CREATE_SCHEMA = TypeVar("CREATE_SCHEMA")
@@ -37,6 +45,7 @@ class CRUDApiDoc:
     create: Optional[ApiDoc] = None
     update: Optional[ApiDoc] = None
     delete: Optional[ApiDoc] = None
+    export: Optional[ApiDoc] = None
 
     def get_api_doc(self, func_name: str) -> ApiDoc:
         return self.__dict__.get(func_name)
@@ -44,8 +53,26 @@ class CRUDApiDoc:
 
 class CRUDEndpoints(Generic[READ_SCHEMA, CREATE_SCHEMA, ID], RestEndpoints):
     override_api_doc: CRUDApiDoc = CRUDApiDoc()
+    # serialize the resources straight to bytes with the codec instead of validating them against the response model and
+    # converting them with jsonable_encoder
+    fast_response: bool = False
+    # expose GET /export streaming all the resources as NDJSON
+    enable_export: bool = False
+    export_batch_size: int = 1000
+    # time to live in seconds of the read_all responses kept in the page cache of the service, the store default if
+    # None. The cached pages are invalidated by the writes through the service class, in every process sharing the store
+    page_cache_ttl: Optional[float] = None
+    # answer conditional requests with ETags, If-None-Match on reads and If-Match on update and delete
+    enable_etag: bool = False
+    # model attribute changing on every write (version, updated_at...), ETags of single resources are computed from it
+    # instead of the serialized resource and If-Match is checked by the write itself
+    version_attribute: Optional[str] = None
 
-    def __init__(self, service: CRUDService[MODEL, ID], mapper: BaseMapper[MODEL, READ_SCHEMA, CREATE_SCHEMA]):
+    def __init__(
+            self,
+            service: CRUDService[MODEL, ID],
+            mapper: BaseMapper[MODEL, READ_SCHEMA, CREATE_SCHEMA]
+    ):
         type_args = get_args(self.__class__.__orig_bases__[0])
 
         self.read_schema = type_args[0]
@@ -56,28 +83,52 @@ class CRUDEndpoints(Generic[READ_SCHEMA, CREATE_SCHEMA, ID], RestEndpoints):
         validate_type_arg(self.create_schema, BaseModel)
         validate_type_arg(self.id)
 
-        for endpoint in self.endpoints:
-            request: dict = getattr(endpoint, "_request")
-            # override request params with values coming from specific endpoints
-            override_api_doc = self.override_api_doc.get_api_doc(endpoint.__name__)
-            if override_api_doc:
-                request.update(**override_api_doc.__dict__)
-            # change signature to get real body instead of TypeVar
-            signature = inspect.signature(endpoint)
-            parameters = list(signature.parameters.values())
-            typed_parameters = []
-            for p in parameters:
-                if p.annotation == ID:
-                    typed_parameters.append(p.replace(kind=inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=self.id))
-                elif p.annotation == CREATE_SCHEMA:
-                    typed_parameters.append(p.replace(kind=inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=self.create_schema))
-                else:
-                    typed_parameters.append(p)
-            endpoint.__signature__ = signature.replace(parameters=typed_parameters)
-
-        super().__init__()
         self.service = service
         self.mapper = mapper
+        super().__init__()
+
+    @property
+    def page_cache(self) -> Optional[CacheStore]:
+        return self.service.page_cache
+
+    @property
+    def endpoints(self) -> List[Callable]:
+        return [e for e in super().endpoints if self.enable_export or e.__name__ != "export"]
+
+    def _endpoint(self, func: Callable) -> Callable:
+        endpoint = super()._endpoint(func)
+        # set on the bound endpoint, the class function is shared with the classes of other type arguments
+        endpoint.__signature__ = self._typed_signature(func)
+        return endpoint
+
+    def _route_options(self, func: Callable) -> Dict[str, Any]:
+        options = super()._route_options(func)
+        # override request params with values coming from specific endpoints
+        override_api_doc = self.override_api_doc.get_api_doc(func.__name__)
+        if override_api_doc:
+            options.update(**override_api_doc.__dict__)
+        if func.__name__ == "read_all" and options.get("response_model") is not None:
+            # read_all answers with a slice in cursor mode
+            options["response_model"] = Union[options["response_model"], SliceSchema[self.read_schema]]
+        return options
+
+    def _typed_signature(self, func: Callable) -> inspect.Signature:
+        """
+        Returns the signature of the bound endpoint of a function, with the type arguments of the class instead of the
+        TypeVars so that FastAPI gets the real body and path parameter types.
+        """
+        signature = inspect.signature(func)
+        typed_parameters = []
+        for p in list(signature.parameters.values())[1:]:
+            if p.annotation == ID:
+                typed_parameters.append(p.replace(kind=inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=self.id))
+            elif p.annotation == CREATE_SCHEMA:
+                typed_parameters.append(
+                    p.replace(kind=inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=self.create_schema)
+                )
+            else:
+                typed_parameters.append(p)
+        return signature.replace(parameters=typed_parameters)
 
     @get("/", status_code=status.HTTP_200_OK)
     async def read_all(
@@ -86,35 +137,197 @@ class CRUDEndpoints(Generic[READ_SCHEMA, CREATE_SCHEMA, ID], RestEndpoints):
             response: Response,
             page_request: PageRequest = Depends(pageable_parameters),
             sort: Optional[Sort] = Depends(sort_parameters),
+            cursor: Optional[str] = Depends(cursor_parameters),
+            filter: Optional[Filter] = Depends(filter_parameters),
+            fields: Optional[List[str]] = Depends(fields_parameters),
+    ):
+        self._validate_sort(sort)
+        if self.page_cache is not None:
+            key = await self._page_cache_key(request, page_request, sort, cursor, filter, fields)
+            cached = await self.page_cache.get(key)
+            if cached is not None:
+                body, link = cached
+                response.headers["Link"] = link
+                return self._json_body(body, request, response)
+        try:
+            load_fields = self._load_fields(fields)
+            if cursor is not None:
+                # keyset pagination, the page index is ignored
+                page_cursor = Cursor.decode(cursor) if cursor else None
+                page_slice = await self.service.find_slice(page_cursor, page_request.size, sort, filter, load_fields)
+            else:
+                page = await self.service.find_page(page_request, sort, filter, load_fields)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if cursor is not None:
+            page_slice.content = self.mapper.map_many_to_read_schema(page_slice.content, fields)
+            schema = self._sliced(page_slice, request, response)
+        else:
+            page.content = self.mapper.map_many_to_read_schema(page.content, fields)
+            schema = self._paginated(page, request, response)
+        if self.page_cache is not None:
+            body = self.codec.dumps(schema)
+            await self.page_cache.set(key, (body, response.headers["Link"]), self.page_cache_ttl)
+            return self._json_body(body, request, response)
+        if self.enable_etag:
+            return self._json_body(self.codec.dumps(schema), request, response)
+        # partial resources don't match a read schema response model, slices don't match a page response model
+        if self.fast_response or fields is not None or cursor is not None:
+            return self._json(schema, response)
+        return schema
+
+    @get("/export", status_code=status.HTTP_200_OK, response_class=StreamingResponse)
+    async def export(
+            self,
+            sort: Optional[Sort] = Depends(sort_parameters),
+            filter: Optional[Filter] = Depends(filter_parameters)
     ):
-        page = await self.service.find_page(page_request, sort)
-        page.content = [self.mapper.map_to_read_schema(m) for m in page.content]
-        return self._paginated(page, request, response)
+        self._validate_sort(sort)
+        return StreamingResponse(self._export_lines(sort, filter), media_type="application/x-ndjson")
 
     @post("/", status_code=status.HTTP_201_CREATED)
     async def create(self, payload: CREATE_SCHEMA, request: Request, response: Response) -> READ_SCHEMA:
         model = self.mapper.map_to_model(payload)
         model = await self.service.create(model)
-        schema = self.mapper.map_to_read_schema(model)
-        return self._created(schema, request, response)
+        schema = self._created(self.mapper.map_to_read_schema(model), request, response)
+        if self.fast_response:
+            response.status_code = status.HTTP_201_CREATED
+            return self._json(schema, response)
+        return schema
 
     @get("/{id}", status_code=status.HTTP_200_OK)
-    async def read_one(self, id: ID) -> READ_SCHEMA:
+    async def read_one(
+            self,
+            id: ID,
+            request: Request,
+            response: Response,
+            fields: Optional[List[str]] = Depends(fields_parameters)
+    ) -> READ_SCHEMA:
         try:
-            model = await self.service.find_by_id(id)
-            return self.mapper.map_to_read_schema(model)
+            model = await self.service.find_by_id(id, self._load_fields(fields))
         except EntityNotFoundError:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+        if not self.enable_etag:
+            schema = self.mapper.map_to_read_schema(model, fields)
+            return schema if fields is None and not self.fast_response else self._json(schema, response)
+        etag = self._version_etag(model, fields)
+        if etag is None:
+            body = self.codec.dumps(self.mapper.map_to_read_schema(model, fields))
+            return self._conditional_json(body, request, response)
+        # the version is enough to answer, mapping and serialization are skipped
+        if self._etag_matches(request.headers.get("If-None-Match"), etag):
+            return self._not_modified(etag)
+        response.headers["ETag"] = etag
+        return self._json(self.mapper.map_to_read_schema(model, fields), response)
 
     @put("/{id}", status_code=status.HTTP_200_OK)
-    async def update(self, id: ID, payload: CREATE_SCHEMA) -> READ_SCHEMA:
+    async def update(self, id: ID, payload: CREATE_SCHEMA, request: Request, response: Response) -> READ_SCHEMA:
         model = self.mapper.map_to_model(payload)
-        model = await self.service.update(id, model)
-        return self.mapper.map_to_read_schema(model)
+        try:
+            async with self._if_match(id, request) as filter:
+                model = await self.service.update(id, model, filter)
+        except EntityNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        except StaleEntityError:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED)
+        schema = self.mapper.map_to_read_schema(model)
+        if self.enable_etag:
+            response.headers["ETag"] = self._etag(model, schema)
+        return self._json(schema, response) if self.fast_response else schema
 
     @delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-    async def delete(self, id: ID):
+    async def delete(self, id: ID, request: Request):
         try:
-            return await self.service.delete(id)
+            async with self._if_match(id, request) as filter:
+                await self.service.delete(id, filter)
         except EntityNotFoundError:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+        except StaleEntityError:
+            raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED)
+
+    async def _export_lines(self, sort: Optional[Sort], filter: Optional[Filter]) -> AsyncIterator[bytes]:
+        lines = []
+        async for model in self.service.stream_all(sort, self.export_batch_size, filter):
+            lines.append(self.codec.dumps(self.mapper.map_to_read_schema(model)))
+            if len(lines) == self.export_batch_size:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+    def _validate_sort(self, sort: Optional[Sort]):
+        """
+        Raises a 422 HTTPException if the resources can't be sorted with the given options.
+        """
+        try:
+            self.service.validate_sort(sort)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    def _load_fields(self, fields: Optional[List[str]]) -> Optional[List[str]]:
+        """
+        Returns the model attributes to load for the given read schema fields, raises a ValueError on unknown fields.
+        """
+        if fields is None:
+            return None
+        self.mapper.partial_read_schema(fields)
+        return [*fields, self.version_attribute] if self.version_attribute is not None else fields
+
+    def _json_body(self, body: bytes, request: Request, response: Response) -> Response:
+        if self.enable_etag:
+            return self._conditional_json(body, request, response)
+        return self._json_bytes(body, response)
+
+    @asynccontextmanager
+    async def _if_match(self, id: ID, request: Request) -> AsyncIterator[Optional[Filter]]:
+        """
+        Makes the write done within the block conditional on the If-Match header, raises a StaleEntityError if the
+        resource does not match it.
+
+        Version ETags are matched by the write itself, with the filter yielded to it. The other ETags are compared with
+        the resource read from the primary and locked in the transaction of the write.
+        """
+        if_match = request.headers.get("If-Match")
+        if not self.enable_etag or if_match is None or if_match.strip() == "*":
+            yield None
+            return
+        if self.version_attribute is not None:
+            prefix = f"\"{id}-"
+            tags = [t.strip() for t in if_match.split(",")]
+            # weak tags never match If-Match
+            versions = [t[len(prefix):-1] for t in tags if t.startswith(prefix) and t.endswith("\"")]
+            yield Filter.and_(Criterion(key=self.version_attribute, operator=Operator.IN, value=versions))
+            return
+        async with self.service.transaction():
+            model = await self.service.find_by_id(id, for_update=True)
+            if not self._etag_matches(if_match, self._etag(model), weak=False):
+                raise StaleEntityError()
+            yield None
+
+    def _etag(self, model: MODEL, schema: READ_SCHEMA = None) -> str:
+        """
+        Returns the ETag of a resource, from its version or its serialized read schema.
+        """
+        etag = self._version_etag(model)
+        if etag is None:
+            schema = schema if schema is not None else self.mapper.map_to_read_schema(model)
+            etag = self._body_etag(self.codec.dumps(schema))
+        return etag
+
+    def _version_etag(self, model: MODEL, fields: Optional[List[str]] = None) -> Optional[str]:
+        if self.version_attribute is None:
+            return None
+        etag = f"\"{model.id}-{getattr(model, self.version_attribute)}\""
+        # the partial representations of a version differ from the full one
+        return etag if fields is None else f"W/{etag}"
+
+    async def _page_cache_key(self, request: Request, *params: Any) -> str:
+        """
+        Returns the page cache key of the given read_all parameters, including the page generation of the service so
+        that the writes of any process invalidate the cached pages.
+        """
+        generation = await self.service.page_generation()
+        digest = hashlib.sha1(json_dumps([str(request.base_url), request.url.path, *params])).hexdigest()
+        return f"{self.__class__.__name__}:{generation}:{digest}"
@@ -1,7 +1,10 @@
-from typing import Generic, TypeVar, get_args
+import functools
+from typing import Generic, TypeVar, get_args, List, Tuple, Callable, Optional, Iterable, Any, Type, FrozenSet, \
+    get_type_hints
 
 from fastapi.encoders import jsonable_encoder
-from pydantic import BaseModel
+from pydantic import BaseModel, create_model
+from pydantic.utils import lenient_issubclass
 
 from fastapi_starterkit.utils import validate_type_arg
 
@@ -9,8 +12,33 @@ READ_SCHEMA = TypeVar("READ_SCHEMA")
 CREATE_SCHEMA = TypeVar("CREATE_SCHEMA")
 MODEL = TypeVar("MODEL")
 
+_MISSING = object()
+
+# (attribute name, keyword argument, converter applied to the value if any)
+MappingPlan = List[Tuple[str, str, Optional[Callable[[Any], Any]]]]
+
+
+@functools.lru_cache(maxsize=128)
+def _partial_schema(schema: Type[BaseModel], fields: FrozenSet[str]) -> Type[BaseModel]:
+    """
+    Returns a schema holding only the given fields of a schema, created once per set of fields.
+    """
+    hints = get_type_hints(schema)
+    definitions = {f.name: (hints[f.name], f.field_info) for f in schema.__fields__.values() if f.name in fields}
+    return create_model(f"Partial{schema.__name__}", __config__=schema.__config__, **definitions)
+
 
 class BaseMapper(Generic[MODEL, READ_SCHEMA, CREATE_SCHEMA]):
+    """
+    Mapper between a model and its schemas.
+
+    The attributes to copy are resolved once from the model columns/fields and the schema fields, only nested schemas
+    still go through `jsonable_encoder`.
+
+    validate_read_schema: validate read schemas built from models, set to False to trust the model values and build
+    them with `construct`.
+    """
+    validate_read_schema: bool = True
 
     def __init__(self):
         type_args = get_args(self.__class__.__orig_bases__[0])
@@ -22,8 +50,83 @@ class BaseMapper(Generic[MODEL, READ_SCHEMA, CREATE_SCHEMA]):
         validate_type_arg(self.create_schema, BaseModel)
         validate_type_arg(self.model)
 
-    def map_to_read_schema(self, model: MODEL) -> READ_SCHEMA:
-        return self.read_schema(**jsonable_encoder(model))
+        model_attributes = self._model_attributes(self.model)
+        self._read_plan = self._mapping_plan(self.read_schema, model_attributes)
+        self._model_plan = [
+            (name, name, converter) for name, _, converter in self._mapping_plan(self.create_schema, model_attributes)
+        ]
+        self._from_orm = getattr(self.read_schema.Config, "orm_mode", False)
+
+    def map_to_read_schema(self, model: MODEL, fields: Optional[List[str]] = None) -> READ_SCHEMA:
+        """
+        Returns the read schema of a model, limited to the given fields if any.
+        """
+        if fields is not None:
+            return self._map_to_partial_read_schema(model, self.partial_read_schema(fields), frozenset(fields))
+        if not self.validate_read_schema:
+            return self.read_schema.construct(**self._values(model, self._read_plan))
+        if self._from_orm:
+            return self.read_schema.from_orm(model)
+        return self.read_schema(**self._values(model, self._read_plan))
+
+    def map_many_to_read_schema(self, models: Iterable[MODEL], fields: Optional[List[str]] = None) -> List[READ_SCHEMA]:
+        if fields is not None:
+            schema, field_set = self.partial_read_schema(fields), frozenset(fields)
+            return [self._map_to_partial_read_schema(m, schema, field_set) for m in models]
+        map_to_read_schema = self.map_to_read_schema
+        return [map_to_read_schema(m) for m in models]
+
+    def partial_read_schema(self, fields: List[str]) -> Type[BaseModel]:
+        """
+        Returns the read schema limited to the given fields, raises a ValueError on fields not in the read schema.
+        """
+        unknown_fields = [f for f in fields if f not in self.read_schema.__fields__]
+        if unknown_fields:
+            raise ValueError(f"Unknown fields {', '.join(unknown_fields)}")
+        return _partial_schema(self.read_schema, frozenset(fields))
 
     def map_to_model(self, schema: CREATE_SCHEMA) -> MODEL:
-        return self.model(**jsonable_encoder(schema))
+        return self.model(**self._values(schema, self._model_plan))
+
+    def _map_to_partial_read_schema(self, model: MODEL, schema: Type[BaseModel], fields: FrozenSet[str]) -> BaseModel:
+        # attributes outside of the fields may not be loaded, they must not be read
+        values = self._values(model, [p for p in self._read_plan if p[0] in fields])
+        if not self.validate_read_schema:
+            return schema.construct(**values)
+        return schema(**values)
+
+    @staticmethod
+    def _values(obj: Any, plan: MappingPlan) -> dict:
+        values = {}
+        for name, key, converter in plan:
+            value = getattr(obj, name, _MISSING)
+            if value is _MISSING:
+                # let the target apply its default
+                continue
+            values[key] = value if converter is None or value is None else converter(value)
+        return values
+
+    @staticmethod
+    def _model_attributes(model: Type[Any]) -> Optional[List[str]]:
+        """
+        Returns the attribute names of a pydantic or SQLAlchemy model, None if they can't be resolved.
+        """
+        if lenient_issubclass(model, BaseModel):
+            return list(model.__fields__)
+        mapper = getattr(model, "__mapper__", None)
+        if mapper is not None:
+            return [attr.key for attr in mapper.attrs]
+        return None
+
+    @staticmethod
+    def _mapping_plan(schema: Type[BaseModel], model_attributes: Optional[List[str]]) -> MappingPlan:
+        """
+        Returns the schema fields available on the model, with the encoder to apply to nested schemas.
+        """
+        plan = []
+        for field in schema.__fields__.values():
+            if model_attributes is not None and field.name not in model_attributes:
+                continue
+            converter = jsonable_encoder if lenient_issubclass(field.type_, BaseModel) else None
+            plan.append((field.name, field.alias, converter))
+        return plan
@@ -1,8 +1,16 @@
-from typing import TypeVar, Generic, List
+import asyncio
+import functools
+import uuid
+from contextvars import ContextVar, Context
+from typing import TypeVar, Generic, List, Optional, AsyncIterator, Iterable, Dict, AsyncContextManager, Any, \
+    Callable, Awaitable, FrozenSet
 
-from fastapi_starterkit.data.domain.pageable import PageRequest, Page
+from fastapi_starterkit.cache import CacheStore, MemoryCacheStore
+from fastapi_starterkit.data.domain.filter import Filter
+from fastapi_starterkit.data.domain.pageable import PageRequest, Page, Cursor, Slice
 from fastapi_starterkit.data.domain.sort import Sort
 from fastapi_starterkit.data.repository.core import PagingRepository
+from fastapi_starterkit.data.repository.routing import stick_to_primary, primary_until
 
 T = TypeVar("T")
 ID = TypeVar("ID")
@@ -12,28 +20,88 @@ class EntityNotFoundError(Exception):
     pass
 
 
+class StaleEntityError(Exception):
+    """
+    Raised when a conditional write finds the entity but the entity no longer meets the filter of the write.
+    """
+
+
 class CRUDService(Generic[T, ID]):
+    """
+    Service exposing CRUD operations on the resources of a repository.
+
+    Attributes:
+        repository The repository of the resources
+        page_cache The store of the pages of resources cached by the endpoints if any. Every write through the service
+                   replaces the page generation kept in the store once committed, invalidating the pages cached by
+                   every process sharing the store.
+    """
 
-    def __init__(self, repository: PagingRepository):
+    def __init__(self, repository: PagingRepository, page_cache: CacheStore = None):
         self.repository = repository
+        self.page_cache = page_cache
+
+    def validate_sort(self, sort: Optional[Sort]):
+        """
+        Raises a ValueError if the resources can't be sorted with the given options.
+        """
+        self.repository.validate_sort(sort)
+
+    def transaction(self) -> AsyncContextManager[None]:
+        """
+        Returns a context running the service calls made within it in one transaction of the repository, committed
+        once at exit and rolled back on errors.
+        """
+        return self.repository.transaction()
+
+    async def after_commit(self, callback: Callable[[], Awaitable[Any]]):
+        """
+        Runs the callback once the current transaction of the repository is committed, right away outside of a
+        transaction.
+        """
+        await self.repository.after_commit(callback)
+
+    async def find_all(self, sort: Sort = None, filter: Filter = None) -> List[T]:
+        """
+        Returns all the resources matching the filter.
+        """
+        return await self.repository.find_all(sort, filter)
+
+    def stream_all(self, sort: Sort = None, batch_size: int = 1000, filter: Filter = None) -> AsyncIterator[T]:
+        """
+        Yields all the resources matching the filter without loading them all at once.
+        """
+        return self.repository.stream_all(sort, batch_size, filter)
 
-    async def find_all(self, sort: Sort = None) -> List[T]:
+    async def find_page(
+            self, page_request: PageRequest, sort: Sort = None, filter: Filter = None, fields: List[str] = None
+    ) -> Page[T]:
         """
-        Returns all the resources.
+        Returns a subset of resources mathing the paging restriction and the filter, with at least the given fields
+        loaded if any.
         """
-        return await self.repository.find_all(sort)
+        return await self.repository.find_page(page_request, sort, filter, fields)
 
-    async def find_page(self, page_request: PageRequest, sort: Sort = None) -> Page[T]:
+    async def find_slice(
+            self,
+            cursor: Optional[Cursor],
+            size: int,
+            sort: Sort = None,
+            filter: Filter = None,
+            fields: List[str] = None
+    ) -> Slice[T]:
         """
-        Returns a subset of resources mathing the paging restriction.
+        Returns a subset of resources matching the filter following the cursor, with at least the given fields loaded
+        if any.
         """
-        return await self.repository.find_page(page_request, sort)
+        return await self.repository.find_slice(cursor, size, sort, filter, fields)
 
-    async def find_by_id(self, id: ID) -> T:
+    async def find_by_id(self, id: ID, fields: List[str] = None, for_update: bool = False) -> T:
         """
-        Returns a resource by its id.
+        Returns a resource by its id, with at least the given fields loaded if any. With `for_update`, the resource is
+        read from the primary and locked until the end of the transaction.
         """
-        model = await self.repository.find_by_id(id)
+        model = await self.repository.find_by_id(id, fields, for_update)
         if model is None:
             raise EntityNotFoundError()
         return model
@@ -42,24 +110,241 @@ class CRUDService(Generic[T, ID]):
         """
         Create a resource.
         """
-        return await self.repository.save(model)
+        try:
+            return await self.repository.save(model)
+        finally:
+            await self._invalidate_pages_after_commit()
 
-    async def update(self, id: ID, model: T) -> T:
+    async def update(self, id: ID, model: T, filter: Filter = None) -> T:
         """
-        Update a resource.
+        Update a resource, only if it meets the filter if any.
         """
-        existing_model = await self.repository.find_by_id(id)
-        if existing_model is None:
-            raise EntityNotFoundError()  # Create instead of not found ?
-        for attr, value in vars(model).items():
-            if attr != "id":
-                setattr(existing_model, attr, value)
-        return await self.repository.save(existing_model)
+        # private attributes hold the ORM state, not values
+        values = {attr: value for attr, value in vars(model).items() if attr != "id" and not attr.startswith("_")}
+        try:
+            model = await self.repository.update_by_id(id, values, filter)
+        finally:
+            await self._invalidate_pages_after_commit()
+        if model is None:
+            await self._not_written(id, filter)
+        return model
 
-    async def delete(self, id: ID):
+    async def save_all(self, models: Iterable[T]) -> List[T]:
         """
-        Delete a resource.
+        Create or update several resources.
         """
-        if not await self.repository.exists_by_id(id):
-            raise EntityNotFoundError()
-        await self.repository.delete_by_id(id)
+        try:
+            return await self.repository.save_all(models)
+        finally:
+            await self._invalidate_pages_after_commit()
+
+    async def delete(self, id: ID, filter: Filter = None):
+        """
+        Delete a resource, only if it meets the filter if any.
+        """
+        try:
+            deleted = await self.repository.delete_by_id(id, filter)
+        finally:
+            await self._invalidate_pages_after_commit()
+        if not deleted:
+            await self._not_written(id, filter)
+
+    async def delete_all_by_id(self, ids: Iterable[ID]):
+        """
+        Delete several resources.
+        """
+        try:
+            await self.repository.delete_all_by_id(ids)
+        finally:
+            await self._invalidate_pages_after_commit()
+
+    async def page_generation(self) -> Optional[str]:
+        """
+        Returns the generation of the cached pages, to include in their keys. None without page cache.
+        """
+        if self.page_cache is None:
+            return None
+        generation = await self.page_cache.get(self._page_generation_key())
+        if generation is None:
+            generation = await self._invalidate_pages()
+        return generation
+
+    async def _invalidate_pages_after_commit(self):
+        if self.page_cache is not None:
+            await self.repository.after_commit(self._invalidate_pages)
+
+    async def _invalidate_pages(self) -> str:
+        """
+        Replaces the page generation. It is a random token rather than a counter, so that a generation evicted from
+        the store can't come back and serve the pages cached before.
+        """
+        generation = uuid.uuid4().hex
+        await self.page_cache.set(self._page_generation_key(), generation)
+        return generation
+
+    def _page_generation_key(self) -> str:
+        return f"{self.__class__.__name__}:page_generation"
+
+    async def _not_written(self, id: ID, filter: Optional[Filter]):
+        """
+        Raises the error of a write which matched no resource.
+        """
+        if filter is not None and await self.repository.exists_by_id(id):
+            raise StaleEntityError()
+        raise EntityNotFoundError()  # Create instead of not found ?
+
+
+class CachedCRUDService(CRUDService[T, ID]):
+    """
+    CRUDService keeping the resources read by id in a cache store. Writes done through the service update the cache,
+    concurrent reads of the same missing resource share a single repository call.
+
+    Attributes:
+        store  The cache store, an in-process LRU store by default
+        ttl    The time to live of the cached resources in seconds, the store default if None
+        hits   The number of reads served by the cache
+        misses The number of reads served by the repository
+    """
+
+    def __init__(
+            self,
+            repository: PagingRepository,
+            store: CacheStore = None,
+            ttl: Optional[float] = None,
+            page_cache: CacheStore = None
+    ):
+        super().__init__(repository, page_cache)
+        self.store = store or MemoryCacheStore()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._loading: Dict[str, asyncio.Task] = {}
+        # bumped by every write of a key, right away and once committed, so that a load overtaken by a write does not
+        # cache the value it read
+        self._write_tokens: Dict[str, int] = {}
+        # the keys with uncommitted writes in the current context, read from the repository so that the context sees its
+        # own writes
+        self._written: ContextVar[FrozenSet[str]] = ContextVar(f"written_{id(self)}", default=frozenset())
+
+    async def find_by_id(self, id: ID, fields: List[str] = None, for_update: bool = False) -> T:
+        key = self._key(id)
+        if for_update or key in self._written.get():
+            return await super().find_by_id(id, fields, for_update)
+        model = await self.store.get(key)
+        if model is not None:
+            self.hits += 1
+            return model
+        self.misses += 1
+        if fields is not None:
+            # partial resources are not cached
+            return await super().find_by_id(id, fields)
+        loading = self._loading.get(key)
+        if loading is None:
+            # the shared load runs outside of the scope and the transaction of the first reader, so that the others do
+            # not get its uncommitted writes, but keeps reading from the primary after a write of the client
+            context = Context()
+            context.run(stick_to_primary, primary_until())
+            loading = context.run(asyncio.ensure_future, self._load(key, id))
+            self._loading[key] = loading
+        # a cancelled reader must not cancel the load shared with the others
+        return await asyncio.shield(loading)
+
+    async def create(self, model: T) -> T:
+        model = await super().create(model)
+        await self._cache(model)
+        return model
+
+    async def update(self, id: ID, model: T, filter: Filter = None) -> T:
+        try:
+            model = await super().update(id, model, filter)
+        except (EntityNotFoundError, StaleEntityError):
+            await self._evict(id)
+            raise
+        await self._cache(model)
+        return model
+
+    async def save_all(self, models: Iterable[T]) -> List[T]:
+        models = await super().save_all(models)
+        for model in models:
+            await self._cache(model)
+        return models
+
+    async def delete(self, id: ID, filter: Filter = None):
+        try:
+            await super().delete(id, filter)
+        finally:
+            await self._evict(id)
+
+    async def delete_all_by_id(self, ids: Iterable[ID]):
+        ids = list(ids)
+        try:
+            await super().delete_all_by_id(ids)
+        finally:
+            await self._evict(*ids)
+
+    async def _load(self, key: str, id: ID) -> T:
+        token = self._write_tokens.get(key, 0)
+        try:
+            model = await super().find_by_id(id)
+            # the load reads in a transaction of its own, already committed
+            await self._set_unless_written(key, model, token)
+            return model
+        finally:
+            if self._loading.get(key) is asyncio.current_task():
+                del self._loading[key]
+
+    async def _cache(self, model: T):
+        """
+        Caches a written resource once the write is committed. The previous entry is evicted right away, the reads
+        made until the commit load the committed resource.
+        """
+        key = self._key(model.id)
+        self._mark_written([key], True)
+        await self._evict_keys([key])
+        await self.repository.after_commit(functools.partial(self._set_written, key, model))
+
+    async def _evict(self, *ids: ID):
+        """
+        Evicts written resources, again once the write is committed since the reads made until the commit may load
+        the previous values.
+        """
+        keys = [self._key(id) for id in ids]
+        self._mark_written(keys, True)
+        await self._evict_keys(keys)
+        await self.repository.after_commit(functools.partial(self._evict_written, keys))
+
+    async def _set_written(self, key: str, model: T):
+        self._mark_written([key], False)
+        self._bump_write_token(key)
+        await self.store.set(key, model, self.ttl)
+
+    async def _evict_written(self, keys: List[str]):
+        self._mark_written(keys, False)
+        await self._evict_keys(keys)
+
+    async def _set_unless_written(self, key: str, model: T, token: int):
+        """
+        Caches a loaded resource unless the key was written since the load started.
+        """
+        if self._write_tokens.get(key, 0) == token:
+            await self.store.set(key, model, self.ttl)
+
+    async def _evict_keys(self, keys: List[str]):
+        for key in keys:
+            self._bump_write_token(key)
+            self._loading.pop(key, None)
+        if keys:
+            await self.store.delete(*keys)
+
+    def _mark_written(self, keys: List[str], uncommitted: bool):
+        """
+        Adds the keys to the uncommitted writes of the current context, or removes them once committed.
+        """
+        written = self._written.get()
+        self._written.set(written.union(keys) if uncommitted else written.difference(keys))
+
+    def _bump_write_token(self, key: str):
+        self._write_tokens[key] = self._write_tokens.get(key, 0) + 1
+
+    def _key(self, id: ID) -> str:
+        return f"{self.__class__.__name__}:{id}"
@@ -0,0 +1,23 @@
+from fastapi_starterkit.utils import lazy_attributes
+
+# Entity and Document need the sqlalchemy and mongo extras, they are imported on first access
+_LAZY_ATTRIBUTES = {
+    "Entity": "fastapi_starterkit.data.domain.entity",
+    "Document": "fastapi_starterkit.data.domain.document",
+    "ObjectId": "fastapi_starterkit.data.domain.document",
+    "Filter": "fastapi_starterkit.data.domain.filter",
+    "Criterion": "fastapi_starterkit.data.domain.filter",
+    "Operator": "fastapi_starterkit.data.domain.filter",
+    "PageRequest": "fastapi_starterkit.data.domain.pageable",
+    "Page": "fastapi_starterkit.data.domain.pageable",
+    "Slice": "fastapi_starterkit.data.domain.pageable",
+    "Cursor": "fastapi_starterkit.data.domain.pageable",
+    "CountStrategy": "fastapi_starterkit.data.domain.pageable",
+    "Sort": "fastapi_starterkit.data.domain.sort",
+    "Order": "fastapi_starterkit.data.domain.sort",
+    "Direction": "fastapi_starterkit.data.domain.sort",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
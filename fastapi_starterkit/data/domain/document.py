@@ -26,10 +26,13 @@ class Document(BaseModel):
     id: Optional[ObjectId]
 
     @classmethod
-    def from_mongo(cls, data: dict):
+    def from_mongo(cls, data: dict, partial: bool = False):
         if not data:
             return data
         id = data.pop('_id', None)
+        if partial:
+            # documents read with a projection miss required fields, the stored values are trusted
+            return cls.construct(id=id, **data)
         return cls(id=id, **data)
 
     def mongo(self):
@@ -0,0 +1,101 @@
+from enum import Enum
+from typing import List, Optional, Any, Union
+
+from pydantic import BaseModel, Field
+
+
+class Operator(Enum):
+    """
+    Enumeration for the comparison operators of a Criterion.
+    """
+    EQ = "eq"
+    NE = "ne"
+    IN = "in"
+    GT = "gt"
+    GTE = "gte"
+    LT = "lt"
+    LTE = "lte"
+    LIKE = "like"
+
+    @staticmethod
+    def value_of(name: str) -> Optional["Operator"]:
+        for o in Operator:
+            if o.value == name.lower():
+                return o
+        return None
+
+
+class LogicalOperator(Enum):
+    """
+    Enumeration for the ways of combining the criteria of a Filter.
+    """
+    AND = "and"
+    OR = "or"
+
+
+class Criterion(BaseModel):
+    """
+    Comparison of a property with a value.
+
+    Attributes:
+        key      The property to compare
+        operator The comparison operator
+        value    The value to compare with, a list of values for the `in` operator and a pattern using `%` and `_`
+                 wildcards for the `like` operator
+    """
+    key: str
+    operator: Operator
+    value: Any
+
+    @classmethod
+    def eq(cls, key: str, value: Any) -> "Criterion":
+        return Criterion(key=key, operator=Operator.EQ, value=value)
+
+    @classmethod
+    def in_(cls, key: str, values: List[Any]) -> "Criterion":
+        return Criterion(key=key, operator=Operator.IN, value=values)
+
+    @classmethod
+    def like(cls, key: str, pattern: str) -> "Criterion":
+        return Criterion(key=key, operator=Operator.LIKE, value=pattern)
+
+
+class Filter(BaseModel):
+    """
+    Filter option for queries.
+
+    Attributes:
+        operator The way of combining the criteria
+        criteria The criteria or nested filters to combine
+    """
+    operator: LogicalOperator = LogicalOperator.AND
+    criteria: List[Union[Criterion, "Filter"]] = Field(default_factory=lambda: [])
+
+    @classmethod
+    def and_(cls, *criteria: Union[Criterion, "Filter"]) -> "Filter":
+        """
+        Creates a new Filter matching all the given criteria.
+        """
+        return Filter(operator=LogicalOperator.AND, criteria=list(criteria))
+
+    @classmethod
+    def or_(cls, *criteria: Union[Criterion, "Filter"]) -> "Filter":
+        """
+        Creates a new Filter matching any of the given criteria.
+        """
+        return Filter(operator=LogicalOperator.OR, criteria=list(criteria))
+
+    @classmethod
+    def range(cls, key: str, start: Any = None, end: Any = None) -> "Filter":
+        """
+        Creates a new Filter matching the values between start and end included, a missing bound is not checked.
+        """
+        criteria = []
+        if start is not None:
+            criteria.append(Criterion(key=key, operator=Operator.GTE, value=start))
+        if end is not None:
+            criteria.append(Criterion(key=key, operator=Operator.LTE, value=end))
+        return Filter.and_(*criteria)
+
+
+Filter.update_forward_refs()
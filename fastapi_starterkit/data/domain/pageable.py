@@ -1,21 +1,51 @@
+import base64
+import binascii
+import json
 import math
-from typing import Generic, TypeVar, List, Optional
+from enum import Enum
+from typing import Generic, TypeVar, List, Optional, Any, Dict
 
 from pydantic import BaseModel, Field
 
+from fastapi_starterkit.data.domain.value import ValueObject
+
 T = TypeVar("T")
 
 
-class PageRequest(BaseModel):
+class CountStrategy(str, Enum):
+    """
+    Enumeration for the ways of computing the total amount of items of a Page.
+
+    Without a count (NONE and HAS_NEXT) one more item is read to tell whether a next page exists, the total amount and
+    the last page stay unknown.
+    """
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+    HAS_NEXT = "has_next"
+
+
+class PageRequest(ValueObject):
     """
     Class for pagination information.
 
     Attributes:
-        page The page index, must not be negative
-        size The size of the page to be returned, must be greater than 0
+        page  The page index, must not be negative
+        size  The size of the page to be returned, must be greater than 0
+        count The way of computing the total amount of items, exact by default
     """
-    page: int = Field(ge=0)
-    size: int = Field(gt=0)
+    __slots__ = ("page", "size", "count")
+
+    page: int
+    size: int
+    count: CountStrategy
+
+    def __init__(self, page: int, size: int, count: CountStrategy = CountStrategy.EXACT):
+        if page < 0:
+            raise ValueError("page must not be negative")
+        if size <= 0:
+            raise ValueError("size must be greater than 0")
+        self._set(page=page, size=size, count=CountStrategy(count))
 
     @staticmethod
     def of_size(size: int) -> "PageRequest":
@@ -34,19 +64,19 @@ class PageRequest(BaseModel):
         """
         Return the PageRequest requesting the first page.
         """
-        return PageRequest(page=0, size=self.size)
+        return self if self.page == 0 else self._with_page(0)
 
     def next(self) -> "PageRequest":
         """
         Returns the PageRequest requesting the next Page.
         """
-        return PageRequest(page=self.page + 1, size=self.size)
+        return self._with_page(self.page + 1)
 
     def previous(self) -> "PageRequest":
         """
         Returns the previous PageRequest or the first PageRequest if the current one is already the first one.
         """
-        return self if self.page == 0 else PageRequest(page=self.page - 1, size=self.size)
+        return self if self.page == 0 else self._with_page(self.page - 1)
 
     def has_previous(self) -> bool:
         """
@@ -55,6 +85,56 @@ class PageRequest(BaseModel):
         """
         return self.page > 0
 
+    def _with_page(self, page: int) -> "PageRequest":
+        # the other values are already valid
+        page_request = object.__new__(PageRequest)
+        page_request._set(page=page, size=self.size, count=self.count)
+        return page_request
+
+    @classmethod
+    def _schema(cls) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "page": {"type": "integer", "minimum": 0},
+                "size": {"type": "integer", "exclusiveMinimum": 0},
+                "count": {"type": "string", "enum": [c.value for c in CountStrategy]}
+            },
+            "required": ["page", "size"]
+        }
+
+
+class Cursor(BaseModel):
+    """
+    Class for keyset pagination information, pointing right after the last element of a Slice.
+
+    Attributes:
+        values The sort-key values of the last element, in sort order
+        id     The id of the last element, used as tie-breaker
+    """
+    values: List[Any] = Field(default_factory=lambda: [])
+    id: Any
+
+    def encode(self) -> str:
+        """
+        Returns the opaque url-safe token representing the Cursor.
+        """
+        data = json.dumps([self.values, self.id], separators=(",", ":"), default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode(token: str) -> "Cursor":
+        """
+        Creates a Cursor from a token returned by `encode`, raises a ValueError if the token is malformed.
+        """
+        try:
+            values, id = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+        if not isinstance(values, list):
+            raise ValueError("Invalid cursor")
+        return Cursor(values=values, id=id)
+
 
 class Page(Generic[T], BaseModel):
     """
@@ -64,11 +144,13 @@ class Page(Generic[T], BaseModel):
     Attributes:
         content        The content of this page
         page_request   The paging information
-        total_elements The total amount of items available
+        total_elements The total amount of items available, None if not counted
+        has_more       Whether items are available after this page, used when the total amount is not counted
     """
     content: List[T]
     page_request: Optional[PageRequest]
     total_elements: Optional[int]
+    has_more: Optional[bool]
 
     def number(self) -> int:
         """
@@ -104,6 +186,8 @@ class Page(Generic[T], BaseModel):
         """
         Returns if there is a next Page.
         """
+        if self.total_elements is None and self.has_more is not None:
+            return self.has_more
         return self.number() + 1 < self.total_pages()
 
     def has_previous(self) -> bool:
@@ -139,3 +223,38 @@ class Page(Generic[T], BaseModel):
         if not self.page_request:
             return None
         return self.page_request.previous() if self.has_previous() else None
+
+
+class Slice(Generic[T], BaseModel):
+    """
+    A slice is a sublist of a list of objects retrieved with keyset pagination. Unlike a Page, it does not know the
+    total amount of items but only whether there is a following Slice.
+
+    Attributes:
+        content     The content of this slice
+        size        The requested size of the slice
+        cursor      The Cursor the slice was requested with, None for the first slice
+        next_cursor The Cursor to request the next Slice, None if this slice is the last one
+    """
+    content: List[T]
+    size: int
+    cursor: Optional[Cursor]
+    next_cursor: Optional[Cursor]
+
+    def has_content(self) -> bool:
+        """
+        Returns if the Slice has content at all.
+        """
+        return bool(self.content)
+
+    def has_next(self) -> bool:
+        """
+        Returns if there is a next Slice.
+        """
+        return self.next_cursor is not None
+
+    def is_first(self) -> bool:
+        """
+        Returns if the current Slice is the first one.
+        """
+        return self.cursor is None
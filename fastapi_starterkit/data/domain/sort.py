@@ -1,7 +1,7 @@
 from enum import Enum
-from typing import List, Optional, ClassVar
+from typing import List, Optional, ClassVar, Iterable, Tuple, Dict, Any
 
-from pydantic import BaseModel, Field
+from fastapi_starterkit.data.domain.value import ValueObject
 
 
 class Direction(Enum):
@@ -19,17 +19,17 @@ class Direction(Enum):
 
     @staticmethod
     def value_of(name: str) -> Optional["Direction"]:
-        for d in Direction:
-            if d.name.lower() == name.lower():
-                return d
-        return None
+        return _DIRECTIONS.get(name.lower())
 
     @staticmethod
     def values() -> List["Direction"]:
         return [d for d in Direction]
 
 
-class Order(BaseModel):
+_DIRECTIONS = {d.name.lower(): d for d in Direction}
+
+
+class Order(ValueObject):
     """
     PropertyPath implements the pairing of a Direction and a property.
 
@@ -37,41 +37,66 @@ class Order(BaseModel):
         key       The property to apply the sort
         direction The direction of the sort
     """
+    __slots__ = ("key", "direction")
+
     key: str
     direction: Direction
 
+    def __init__(self, key: str, direction: Direction = Direction.ASC):
+        self._set(key=key, direction=direction if isinstance(direction, Direction) else Direction(direction))
+
+    def with_direction(self, direction: Direction) -> "Order":
+        """
+        Returns an Order on the same property with the given direction.
+        """
+        return self if direction == self.direction else Order(self.key, direction)
 
-class Sort(BaseModel):
+    @classmethod
+    def _schema(cls) -> Dict[str, Any]:
+        return {
+            "type": "object",
+            "properties": {
+                "key": {"type": "string"},
+                "direction": {"type": "integer", "enum": [d.value for d in Direction]}
+            },
+            "required": ["key", "direction"]
+        }
+
+
+class Sort(ValueObject):
     """
     Sort option for queries.
 
     Attributes:
         orders The pairing list of property and Direction
     """
+    __slots__ = ("orders",)
     DEFAULT_DIRECTION: ClassVar[Direction] = Direction.ASC
 
-    orders: List[Order] = Field(default_factory=lambda: [])
+    orders: Tuple[Order, ...]
+
+    def __init__(self, orders: Iterable[Order] = ()):
+        self._set(orders=tuple(Order.validate(o) for o in orders))
 
     @classmethod
     def by(cls, *keys: str, direction: Direction = DEFAULT_DIRECTION) -> "Sort":
         """
         Creates a new Sort for the given Orders.
         """
-        orders = [Order(key=k, direction=direction) for k in keys]
-        return Sort(orders=orders)
+        return Sort(Order(k, direction) for k in keys)
 
     def ascending(self) -> "Sort":
         """
         Returns a new Sort with the current setup but ascending order direction.
         """
-        for order in self.orders:
-            order.direction = Direction.ASC
-        return self
+        return Sort(o.with_direction(Direction.ASC) for o in self.orders)
 
     def descending(self) -> "Sort":
         """
         Returns a new Sort with the current setup but descending order direction.
         """
-        for order in self.orders:
-            order.direction = Direction.DES
-        return self
+        return Sort(o.with_direction(Direction.DES) for o in self.orders)
+
+    @classmethod
+    def _schema(cls) -> Dict[str, Any]:
+        return {"type": "object", "properties": {"orders": {"type": "array", "items": Order._schema()}}}
@@ -0,0 +1,63 @@
+from typing import Any, Dict, Tuple
+
+
+class ValueObject:
+    """
+    Base of the immutable value types, compared and hashed by the values of their slots so that they can be shared
+    between requests and used as cache keys.
+
+    Subclasses declare their attributes in `__slots__`, in the order of their `__init__` arguments, and assign them
+    with `_set`. They can be used as pydantic fields, `_schema` describes them in OpenAPI.
+    """
+    __slots__ = ()
+
+    def _set(self, **values: Any):
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def _values(self) -> Tuple[Any, ...]:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self) -> int:
+        return hash(self._values())
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({values})"
+
+    def __reduce__(self):
+        return self.__class__, self._values()
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value: Any) -> "ValueObject":
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, dict):
+            return cls(**value)
+        raise TypeError(f"{cls.__name__} expected")
+
+    @classmethod
+    def __modify_schema__(cls, field_schema: Dict[str, Any]):
+        field_schema.update(cls._schema())
+
+    @classmethod
+    def _schema(cls) -> Dict[str, Any]:
+        raise NotImplementedError()
@@ -0,0 +1,15 @@
+from fastapi_starterkit.utils import lazy_attributes
+
+# backend repositories are imported on first access, so that only the installed and used backend is loaded
+_LAZY_ATTRIBUTES = {
+    "CRUDRepository": "fastapi_starterkit.data.repository.core",
+    "PagingRepository": "fastapi_starterkit.data.repository.core",
+    "UnindexedSortPolicy": "fastapi_starterkit.data.repository.core",
+    "SqlRepository": "fastapi_starterkit.data.repository.sql",
+    "SessionProvider": "fastapi_starterkit.data.repository.session",
+    "MongoRepository": "fastapi_starterkit.data.repository.mongo",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+__getattr__, __dir__ = lazy_attributes(__name__, _LAZY_ATTRIBUTES)
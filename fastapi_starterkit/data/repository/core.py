@@ -1,8 +1,22 @@
 import abc
-from typing import List, Any, Optional
+import logging
+from enum import Enum
+from typing import List, Any, Optional, Dict, AsyncIterator, FrozenSet, AsyncContextManager, Callable, Awaitable
 
-from fastapi_starterkit.data.domain.pageable import PageRequest, Page
-from fastapi_starterkit.data.domain.sort import Sort
+from fastapi_starterkit.data.domain.filter import Filter
+from fastapi_starterkit.data.domain.pageable import PageRequest, Page, Cursor, Slice
+from fastapi_starterkit.data.domain.sort import Sort, Order, Direction
+
+logger = logging.getLogger(__name__)
+
+
+class UnindexedSortPolicy(str, Enum):
+    """
+    Enumeration for the handling of sorts whose first key has no supporting index.
+    """
+    ALLOW = "allow"
+    WARN = "warn"
+    REFUSE = "refuse"
 
 
 class CRUDRepository(abc.ABC):
@@ -11,7 +25,7 @@ class CRUDRepository(abc.ABC):
     """
 
     @abc.abstractmethod
-    async def count(self) -> int:
+    async def count(self, filter: Filter = None) -> int:
         raise NotImplementedError()
 
     @abc.abstractmethod
@@ -23,7 +37,10 @@ class CRUDRepository(abc.ABC):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    async def delete_by_id(self, id: Any):
+    async def delete_by_id(self, id: Any, filter: Filter = None) -> bool:
+        """
+        Deletes the entity with the given id if it meets the filter, returns whether an entity was deleted.
+        """
         raise NotImplementedError()
 
     @abc.abstractmethod
@@ -31,7 +48,7 @@ class CRUDRepository(abc.ABC):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    async def find_all(self, sort: Sort = None) -> List[Any]:
+    async def find_all(self, sort: Sort = None, filter: Filter = None) -> List[Any]:
         raise NotImplementedError()
 
     @abc.abstractmethod
@@ -39,7 +56,11 @@ class CRUDRepository(abc.ABC):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    async def find_by_id(self, id: Any) -> Optional[Any]:
+    async def find_by_id(self, id: Any, fields: List[str] = None, for_update: bool = False) -> Optional[Any]:
+        """
+        Returns the entity with the given id. With `for_update`, it is read from the primary and locked until the end
+        of the transaction where the database supports it.
+        """
         raise NotImplementedError()
 
     @abc.abstractmethod
@@ -47,15 +68,95 @@ class CRUDRepository(abc.ABC):
         raise NotImplementedError()
 
     @abc.abstractmethod
-    async def save_all(self, models: List[Any]) -> List[Any]:
+    async def save_all(self, models: List[Any], chunk_size: int = None) -> List[Any]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def update_by_id(self, id: Any, values: Dict[str, Any], filter: Filter = None) -> Optional[Any]:
+        """
+        Updates the entity with the given id if it meets the filter, returns None if it does not exist or does not meet
+        the filter.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def transaction(self) -> AsyncContextManager[None]:
+        """
+        Returns a context running the calls made within it in one transaction, committed once at exit and rolled back
+        on errors.
+        """
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def after_commit(self, callback: Callable[[], Awaitable[Any]]):
+        """
+        Runs the callback once the current transaction is committed, right away outside of a transaction. The callback
+        is dropped if the transaction is rolled back.
+        """
         raise NotImplementedError()
 
 
 class PagingRepository(CRUDRepository):
     """
     Extension of CrudRepository to provide additional method to retrieve entities using the pagination.
+
+    Implementations fill `sortable_keys` and `indexed_keys` once at init, sorts are checked against them.
+
+    unindexed_sort: how sorts whose first key has no supporting index, and likely sort the whole table, are handled.
     """
+    unindexed_sort: UnindexedSortPolicy = UnindexedSortPolicy.ALLOW
+    sortable_keys: FrozenSet[str] = frozenset()
+    indexed_keys: FrozenSet[str] = frozenset()
 
     @abc.abstractmethod
-    async def find_page(self, page_request: PageRequest, sort: Sort = None) -> Page[Any]:
+    async def find_page(
+            self, page_request: PageRequest, sort: Sort = None, filter: Filter = None, fields: List[str] = None
+    ) -> Page[Any]:
         raise NotImplementedError()
+
+    @abc.abstractmethod
+    async def find_slice(
+            self,
+            cursor: Optional[Cursor],
+            size: int,
+            sort: Sort = None,
+            filter: Filter = None,
+            fields: List[str] = None
+    ) -> Slice[Any]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def stream_all(self, sort: Sort = None, batch_size: int = 1000, filter: Filter = None) -> AsyncIterator[Any]:
+        raise NotImplementedError()
+
+    def validate_sort(self, sort: Optional[Sort]):
+        """
+        Raises a ValueError if the sort uses unknown keys, or if its first key is not indexed and such sorts are
+        refused.
+        """
+        if sort is None or not sort.orders:
+            return
+        unknown_keys = [o.key for o in sort.orders if o.key not in self.sortable_keys]
+        if unknown_keys:
+            raise ValueError(f"Unknown sort keys {', '.join(unknown_keys)}")
+        key = sort.orders[0].key
+        if key in self.indexed_keys or self.unindexed_sort == UnindexedSortPolicy.ALLOW:
+            return
+        message = f"No index supports sorting {self.__class__.__name__} by {key}"
+        if self.unindexed_sort == UnindexedSortPolicy.REFUSE:
+            raise ValueError(message)
+        logger.warning(message)
+
+    @staticmethod
+    def _keyset_orders(sort: Optional[Sort]) -> List[Order]:
+        """
+        Returns the orders of the given sort followed by the id as tie-breaker, so that every element has a unique
+        position. Orders after the id are dropped since they can't change the position anymore.
+        """
+        orders = []
+        for order in sort.orders if sort else []:
+            orders.append(order)
+            if order.key == "id":
+                return orders
+        orders.append(Order(key="id", direction=Direction.ASC))
+        return orders
@@ -1,104 +1,227 @@
-import asyncio
-from typing import Optional, Iterable, List, Tuple, TypeVar, Generic, get_args
+import re
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Iterable, List, Tuple, TypeVar, Generic, Any, Dict, AsyncIterator, Union, get_args, \
+    Callable, Awaitable
 
 import pymongo
 from bson import ObjectId
-from motor.core import AgnosticCollection
+from pymongo import InsertOne, ReplaceOne, ReturnDocument
+from motor.core import AgnosticCollection, AgnosticClientSession
 
 from fastapi_starterkit.data.domain.document import Document
-from fastapi_starterkit.data.domain.pageable import Page, PageRequest
-from fastapi_starterkit.data.domain.sort import Sort
+from fastapi_starterkit.data.domain.filter import Filter, Criterion, Operator, LogicalOperator
+from fastapi_starterkit.data.domain.pageable import Page, PageRequest, Cursor, Slice, CountStrategy
+from fastapi_starterkit.data.domain.sort import Sort, Order
 from fastapi_starterkit.data.repository.core import PagingRepository
+from fastapi_starterkit.data.repository.routing import stick_to_primary, read_from_primary
 from fastapi_starterkit.utils import validate_type_arg
 
 T = TypeVar("T", bound=Document)
 
+_OPERATORS = {
+    Operator.EQ: "$eq",
+    Operator.NE: "$ne",
+    Operator.IN: "$in",
+    Operator.GT: "$gt",
+    Operator.GTE: "$gte",
+    Operator.LT: "$lt",
+    Operator.LTE: "$lte",
+}
+
+# the client session of the current transaction, shared by the repositories so that a transaction spans them all
+_session: ContextVar[Optional[AgnosticClientSession]] = ContextVar("mongo_session", default=None)
+# the callbacks to run once the current transaction is committed
+_callbacks: ContextVar[Optional[List[Callable[[], Awaitable[Any]]]]] = ContextVar("mongo_after_commit", default=None)
+
 
 class MongoRepository(Generic[T], PagingRepository):
     """
     Mongo repository.
 
     T: the type of object handled by the repository, must be `fastapi_starterkit.data.domain.document.Document`.
+
+    bulk_chunk_size: the amount of documents written per bulk operation by `save_all`.
+
+    indexes: the fields leading an index of the collection, the id is always indexed.
+
+    read_collection: the collection the reads are sent to, usually the collection with a secondary read preference. The
+    reads made after a write are sent to the primary collection for `sticky_window` seconds, so that they see the write
+    while the secondaries catch up.
     """
+    bulk_chunk_size: int = 1000
+    indexes: List[str] = []
+    sticky_window: float = 5
 
-    def __init__(self, collection: AgnosticCollection):
+    def __init__(self, collection: AgnosticCollection, read_collection: AgnosticCollection = None):
         self.collection = collection
+        self.read_collection = read_collection if read_collection is not None else collection
         self.model = get_args(self.__orig_bases__[0])[0]
         validate_type_arg(self.model, Document)
+        self.sortable_keys = frozenset(self.model.__fields__)
+        self.indexed_keys = frozenset(["id", *self.indexes])
 
-    async def count(self) -> int:
+    async def count(self, filter: Filter = None) -> int:
         """
-        Returns the number of documents available.
+        Returns the number of documents available meeting the given filter.
         """
-        return await self.collection.estimated_document_count()
+        query = self._filter_query(filter)
+        session = _session.get()
+        # collection metadata can't be read within a transaction
+        if query or session is not None:
+            return await self._reader().count_documents(query, session=session)
+        return await self._reader().estimated_document_count()
 
     async def delete_all(self):
         """
         Deletes all documents.
         """
-        await self.collection.drop()
+        self._written()
+        session = _session.get()
+        # collections can't be dropped within a transaction
+        if session is not None:
+            await self.collection.delete_many({}, session=session)
+        else:
+            await self.collection.drop()
 
     async def delete_all_by_id(self, ids: Iterable[ObjectId]):
         """
         Deletes all documents with the given IDs.
         """
-        await self.collection.delete_many({"_id": {"$in": ids}})
+        self._written()
+        await self.collection.delete_many({"_id": {"$in": ids}}, session=_session.get())
 
-    async def delete_by_id(self, id: ObjectId):
+    async def delete_by_id(self, id: ObjectId, filter: Filter = None) -> bool:
         """
-        Deletes the document with the given id.
+        Deletes the document with the given id if it meets the given filter, returns whether a document was deleted.
         """
-        await self.collection.delete_one({"_id": id})
+        self._written()
+        query = {"_id": id, **self._filter_query(filter)}
+        return (await self.collection.delete_one(query, session=_session.get())).deleted_count > 0
 
     async def exists_by_id(self, id: ObjectId) -> bool:
         """
         Returns whether a document with the given id exists.
         """
-        return bool(await self.collection.count_documents({"_id": id}))
+        return bool(await self._reader().count_documents({"_id": id}, session=_session.get()))
 
-    async def find_all(self, sort: Sort = None) -> List[T]:
+    async def find_all(self, sort: Sort = None, filter: Filter = None) -> List[T]:
         """
-        Returns all documents sorted by the given options.
+        Returns all documents meeting the given filter sorted by the given options.
         """
         args = {
-            "filter": self._filter_query(),
-            "sort": self._sort_query(sort)
+            "filter": self._filter_query(filter),
+            "sort": self._sort_query(sort),
+            "session": _session.get()
         }
-        result = await self.collection.find(**args).to_list(None)
+        result = await self._reader().find(**args).to_list(None)
         return [self.model.from_mongo(r) for r in result]
 
-    async def find_page(self, page_request: PageRequest, sort: Sort = None) -> Page[T]:
+    async def find_page(
+            self, page_request: PageRequest, sort: Sort = None, filter: Filter = None, fields: List[str] = None
+    ) -> Page[T]:
         """
-        Returns a Page of document meeting the paging restriction.
+        Returns a Page of document meeting the paging restriction and the given filter, only the given fields are
+        read if any.
         """
+        filter = self._filter_query(filter)
+        uncounted = page_request.count in (CountStrategy.NONE, CountStrategy.HAS_NEXT)
         args = {
-            "filter": self._filter_query(),
+            "filter": filter,
+            "projection": self._projection(fields, sort),
             "sort": self._sort_query(sort),
             "skip": page_request.offset(),
-            "limit": page_request.size
+            # one more document tells whether a next page exists without counting
+            "limit": page_request.size + 1 if uncounted else page_request.size,
+            "session": _session.get()
         }
-        documents = await self.collection.find(**args).to_list(None)
-        models = [self.model.from_mongo(doc) for doc in documents]
-        count = await self.count()
+        collection = self._reader()
+        documents = await collection.find(**args).to_list(None)
+        models = [self.model.from_mongo(doc, partial=fields is not None) for doc in documents]
+        if uncounted:
+            return Page(
+                content=models[:page_request.size],
+                page_request=page_request,
+                has_more=len(models) > page_request.size
+            )
+        count = None
+        if page_request.count == CountStrategy.EXACT:
+            count = await collection.count_documents(filter, session=args["session"])
+        elif page_request.count == CountStrategy.ESTIMATED:
+            # collection metadata is only accurate when nothing is filtered, and can't be read within a transaction
+            if filter or args["session"] is not None:
+                count = await collection.count_documents(filter, session=args["session"])
+            else:
+                count = await collection.estimated_document_count()
         return Page(
             content=models,
             page_request=page_request,
             total_elements=count
         )
 
+    async def find_slice(
+            self,
+            cursor: Optional[Cursor],
+            size: int,
+            sort: Sort = None,
+            filter: Filter = None,
+            fields: List[str] = None
+    ) -> Slice[T]:
+        """
+        Returns a Slice of documents meeting the given filter following the given cursor, seeking through the sort keys
+        instead of skipping documents. Only the given fields are read if any.
+        """
+        orders = self._keyset_orders(sort)
+        filter = self._filter_query(filter)
+        if cursor is not None:
+            filter = {"$and": [filter, self._keyset_query(orders, cursor)]}
+        args = {
+            "filter": filter,
+            "projection": self._projection(fields, sort),
+            "sort": self._sort_query(Sort(orders=orders)),
+            "limit": size + 1,
+            "session": _session.get()
+        }
+        documents = await self._reader().find(**args).to_list(None)
+        models = [self.model.from_mongo(doc, partial=fields is not None) for doc in documents]
+        next_cursor = None
+        if len(models) > size:
+            models = models[:size]
+            last = models[-1]
+            next_cursor = Cursor(values=[getattr(last, o.key) for o in orders[:-1]], id=last.id)
+        return Slice(content=models, size=size, cursor=cursor, next_cursor=next_cursor)
+
+    async def stream_all(self, sort: Sort = None, batch_size: int = 1000, filter: Filter = None) -> AsyncIterator[T]:
+        """
+        Yields all documents meeting the given filter sorted by the given options, fetching `batch_size` documents at a
+        time.
+        """
+        args = {
+            "filter": self._filter_query(filter),
+            "sort": self._sort_query(sort),
+            "batch_size": batch_size,
+            "session": _session.get()
+        }
+        async for document in self._reader().find(**args):
+            yield self.model.from_mongo(document)
+
     async def find_all_by_id(self, ids: Iterable[ObjectId]) -> List[T]:
         """
         Returns all documents with the given IDs.
         """
-        result = await self.collection.find(filter={"_id": {"$in": ids}}).to_list(None)
+        result = await self._reader().find(filter={"_id": {"$in": ids}}, session=_session.get()).to_list(None)
         return [self.model.from_mongo(r) for r in result]
 
-    async def find_by_id(self, id: ObjectId) -> Optional[T]:
+    async def find_by_id(self, id: ObjectId, fields: List[str] = None, for_update: bool = False) -> Optional[T]:
         """
-        Returns a document by its id.
+        Returns a document by its id, only the given fields are read if any. With `for_update`, the document is read
+        from the primary. Mongo has no locks, within a transaction a concurrent write of the document makes the
+        following write of the transaction fail with a write conflict.
         """
-        document = await self.collection.find_one({"_id": id})
-        return self.model.from_mongo(document)
+        collection = self.collection if for_update else self._reader()
+        document = await collection.find_one({"_id": id}, self._projection(fields), session=_session.get())
+        return self.model.from_mongo(document, partial=fields is not None)
 
     async def save(self, model: T) -> T:
         """
@@ -106,39 +229,184 @@ class MongoRepository(Generic[T], PagingRepository):
         """
         if not isinstance(model, Document):
             raise ValueError(f"type {type(model)} not handled by repository.")
+        self._written()
         document = model.mongo()
         id = document.get("_id")
         if id is None:
-            id = (await self.collection.insert_one(document)).inserted_id
+            document["_id"] = (await self.collection.insert_one(document, session=_session.get())).inserted_id
+            return self.model.from_mongo(document)
+        document = await self.collection.find_one_and_replace(
+            {"_id": id}, document, return_document=ReturnDocument.AFTER, session=_session.get()
+        )
+        return self.model.from_mongo(document)
+
+    async def save_all(self, models: Iterable[T], chunk_size: int = None) -> List[T]:
+        """
+        Saves all given documents with one bulk write per `chunk_size` documents.
+        """
+        models = list(models)
+        if any(not isinstance(m, Document) for m in models):
+            raise ValueError(f"one of type in the list of model is not handled by repository.")
+        chunk_size = chunk_size or self.bulk_chunk_size
+        self._written()
+        saved = []
+        for i in range(0, len(models), chunk_size):
+            documents = [m.mongo() for m in models[i:i + chunk_size]]
+            requests = []
+            for document in documents:
+                if document.get("_id") is None:
+                    # ids are generated client side, as the driver would, to build the result without a read
+                    document["_id"] = ObjectId()
+                    requests.append(InsertOne(document))
+                else:
+                    requests.append(ReplaceOne({"_id": document["_id"]}, document, upsert=True))
+            await self.collection.bulk_write(requests, session=_session.get())
+            saved.extend(self.model.from_mongo(dict(d)) for d in documents)
+        return saved
+
+    async def update_by_id(self, id: ObjectId, values: Dict[str, Any], filter: Filter = None) -> Optional[T]:
+        """
+        Updates the given attributes of the document with the given id if it meets the given filter, returns the
+        updated document or None if it does not exist or does not meet the filter.
+        """
+        values = {self._field_name(k): v for k, v in values.items()}
+        self._written()
+        document = await self.collection.find_one_and_update(
+            {"_id": id, **self._filter_query(filter)}, {"$set": values}, return_document=ReturnDocument.AFTER,
+            session=_session.get()
+        )
+        return self.model.from_mongo(document)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """
+        Runs the calls made within the block in one multi-document transaction of a client session, committed at exit
+        and aborted on errors. Mongo has no savepoints, a nested block joins the transaction of the outer one.
+        Transactions require a replica set or a sharded cluster.
+        """
+        if _session.get() is not None:
+            yield
+            return
+        callbacks = []
+        async with await self.collection.database.client.start_session() as session:
+            async with session.start_transaction():
+                token = _session.set(session)
+                callbacks_token = _callbacks.set(callbacks)
+                try:
+                    yield
+                finally:
+                    _callbacks.reset(callbacks_token)
+                    _session.reset(token)
+        for callback in callbacks:
+            await callback()
+
+    async def after_commit(self, callback: Callable[[], Awaitable[Any]]):
+        callbacks = _callbacks.get()
+        if callbacks is None:
+            await callback()
         else:
-            await self.collection.replace_one({"_id": id}, document)
-        return await self.find_by_id(id)
+            callbacks.append(callback)
 
-    async def save_all(self, models: Iterable[T]) -> List[T]:
+    def _reader(self) -> AgnosticCollection:
         """
-        Saves all given documents.
+        Returns the collection to read from, the primary one within a transaction and after a write.
         """
-        models = await asyncio.gather(*[self.save(m) for m in models])
-        return list(models)
+        if _session.get() is not None or read_from_primary():
+            return self.collection
+        return self.read_collection
 
-    @staticmethod
-    def _filter_query(filter: dict = None) -> dict:
+    def _written(self):
+        """
+        Sends the following reads of the current context to the primary for `sticky_window` seconds.
+        """
+        if self.read_collection is not self.collection:
+            stick_to_primary(time.time() + self.sticky_window)
+
+    def _filter_query(self, filter: Union[Filter, Criterion] = None) -> dict:
         """
         Build mongo filter query.
         """
         if filter is None:
             return {}
-        return {}
+        if isinstance(filter, Filter):
+            if not filter.criteria:
+                return {}
+            operator = "$and" if filter.operator == LogicalOperator.AND else "$or"
+            return {operator: [self._filter_query(c) for c in filter.criteria]}
+        if filter.key not in self.model.__fields__:
+            raise ValueError(f"Unknown filter key {filter.key}")
+        if filter.operator == Operator.LIKE:
+            condition = {"$regex": self._like_regex(str(filter.value))}
+        elif filter.operator == Operator.IN:
+            condition = {"$in": [self._field_value(filter.key, v) for v in filter.value]}
+        else:
+            condition = {_OPERATORS[filter.operator]: self._field_value(filter.key, filter.value)}
+        return {self._field_name(filter.key): condition}
+
+    @staticmethod
+    def _like_regex(pattern: str) -> str:
+        """
+        Converts a pattern with `%` and `_` wildcards to an anchored regular expression.
+        """
+        regex = "".join(".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern)
+        return f"^{regex}$"
 
     @staticmethod
-    def _sort_query(sort: Sort) -> List[Tuple[str, int]]:
+    def _projection(fields: Optional[List[str]], sort: Sort = None) -> Optional[Dict[str, int]]:
+        """
+        Build mongo projection of the given fields and the sort keys, the id is always returned.
+        """
+        if fields is None:
+            return None
+        sort_keys = [o.key for o in sort.orders] if sort else []
+        # an empty projection would return whole documents
+        return {MongoRepository._field_name(k): 1 for k in ["id", *fields, *sort_keys]}
+
+    def _sort_query(self, sort: Sort) -> List[Tuple[str, int]]:
         """
         Build mongo sort query.
         """
         if sort is None:
             return []
+        self.validate_sort(sort)
         query = []
         for order in sort.orders:
             direction = pymongo.ASCENDING if order.direction.is_ascending() else pymongo.DESCENDING
-            query.append((order.key, direction))
+            query.append((MongoRepository._field_name(order.key), direction))
         return query
+
+    def _keyset_query(self, orders: List[Order], cursor: Cursor) -> dict:
+        """
+        Build mongo filter query selecting the documents positioned after the given cursor.
+        """
+        if len(cursor.values) != len(orders) - 1:
+            raise ValueError("Cursor does not match the sort")
+        keys = [o.key for o in orders]
+        values = [self._field_value(k, v) for k, v in zip(keys, [*cursor.values, cursor.id])]
+        clauses = []
+        for i, order in enumerate(orders):
+            clause = {self._field_name(keys[j]): values[j] for j in range(i)}
+            operator = "$gt" if order.direction.is_ascending() else "$lt"
+            clause[self._field_name(keys[i])] = {operator: values[i]}
+            clauses.append(clause)
+        return {"$or": clauses}
+
+    def _field_value(self, key: str, value: Any) -> Any:
+        """
+        Converts a value decoded from a cursor or a query parameter to the type of the given document field.
+        """
+        field = self.model.__fields__.get(key)
+        if field is None:
+            return value
+        value, errors = field.validate(value, {}, loc=key)
+        if errors:
+            raise ValueError(f"Invalid value for {key}")
+        return value
+
+    @staticmethod
+    def _field_name(key: str) -> str:
+        """
+        Returns the mongo field name of a document attribute.
+        """
+        # mongodb uses `_id` as default key
+        return "_id" if key == "id" else key
@@ -0,0 +1,28 @@
+import time
+from contextvars import ContextVar
+
+# the timestamp until which the reads of the current context are sent to the primary
+_primary_until: ContextVar[float] = ContextVar("primary_until", default=0.0)
+
+
+def primary_until() -> float:
+    """
+    Returns the timestamp until which the reads of the current context are sent to the primary.
+    """
+    return _primary_until.get()
+
+
+def stick_to_primary(until: float):
+    """
+    Sends the reads of the current context to the primary until the given timestamp, so that they see the writes made
+    before it even if the replicas lag behind.
+    """
+    if until > _primary_until.get():
+        _primary_until.set(until)
+
+
+def read_from_primary() -> bool:
+    """
+    Returns whether the reads of the current context must be sent to the primary.
+    """
+    return _primary_until.get() > time.time()
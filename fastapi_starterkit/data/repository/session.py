@@ -0,0 +1,191 @@
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, AsyncIterator, Any, Sequence, Callable, Awaitable, List
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from fastapi_starterkit.data.repository.routing import stick_to_primary, read_from_primary
+
+
+def create_engine(
+        url: str,
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        pool_timeout: float = 30,
+        pool_recycle: int = 1800,
+        pool_pre_ping: bool = True,
+        **kwargs: Any
+) -> AsyncEngine:
+    """
+    Creates an AsyncEngine keeping a pool of connections open between requests.
+
+    pool_size: the amount of connections kept open.
+
+    max_overflow: the amount of connections opened on top of the pool under load, closed when returned.
+
+    pool_timeout: the seconds to wait for a connection when the pool and the overflow are exhausted.
+
+    pool_recycle: the seconds after which a connection is replaced, before the database or a proxy drops it.
+
+    pool_pre_ping: whether a connection is tested before being used, so that a dropped connection is replaced instead
+    of failing the request.
+
+    SQLite databases are not pooled, only `pool_pre_ping` applies to them.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_async_engine(url, pool_pre_ping=pool_pre_ping, **kwargs)
+    return create_async_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=pool_pre_ping,
+        **kwargs
+    )
+
+
+class _RoutingSession(Session):
+    """
+    Session sending the writes, the locking reads and the reads following them to the primary engine and the other
+    reads to one of the read engines of its SessionProvider.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        sessions = self.info["sessions"]
+        # locking reads precede a write
+        if self._flushing or isinstance(clause, UpdateBase) or getattr(clause, "_for_update_arg", None) is not None:
+            self.info["written"] = True
+            stick_to_primary(time.time() + sessions.sticky_window)
+        if self.info.get("written") or read_from_primary():
+            return sessions.engine.sync_engine
+        # the reads of a session stay on one replica, so that they see a consistent state
+        if "read_engine" not in self.info:
+            self.info["read_engine"] = next(sessions._read_engines)
+        return self.info["read_engine"].sync_engine
+
+
+class SessionProvider:
+    """
+    Provider of the AsyncSession used by the SQL repositories.
+
+    A scope shares one session and one transaction between all the repository calls made within it, the transaction is
+    committed once when the scope exits and rolled back on errors. Calls made outside of a scope run in a session and a
+    transaction of their own. Transactions opened within a scope are savepoints of its transaction.
+
+    The session of the current scope is held by a context variable, it is visible to the tasks started within the
+    scope. Callbacks registered with `after_commit` run once the transaction is committed and are dropped when it is
+    rolled back, so that caches are only updated with committed values.
+
+    read_engines: the engines of the replicas of the database. When given, the reads are spread over them while the
+    writes go to the primary engine. The reads made after a write go to the primary for `sticky_window` seconds, so
+    that they see the write while the replicas catch up.
+    """
+
+    def __init__(
+            self,
+            engine: AsyncEngine,
+            read_engines: Sequence[AsyncEngine] = (),
+            sticky_window: float = 5,
+            **session_options: Any
+    ):
+        self.engine = engine
+        self.read_engines = list(read_engines)
+        self.sticky_window = sticky_window
+        self._read_engines = itertools.cycle(self.read_engines)
+        if self.read_engines:
+            session_options = {"sync_session_class": _RoutingSession, "info": {"sessions": self}, **session_options}
+        self.session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, **session_options)
+        self._current: ContextVar[Optional[AsyncSession]] = ContextVar(f"session_{id(self)}", default=None)
+        self._callbacks: ContextVar[Optional[List[Callable[[], Awaitable[Any]]]]] = ContextVar(
+            f"after_commit_{id(self)}", default=None
+        )
+
+    @property
+    def current(self) -> Optional[AsyncSession]:
+        """
+        The session of the current scope, None outside of a scope.
+        """
+        return self._current.get()
+
+    @asynccontextmanager
+    async def scope(self) -> AsyncIterator[AsyncSession]:
+        """
+        Opens a new session for the repository calls made within the scope.
+        """
+        async with self.session_factory() as session:
+            token = self._current.set(session)
+            callbacks_token = self._callbacks.set([])
+            try:
+                yield session
+                await self.commit()
+            except BaseException:
+                await self.rollback()
+                raise
+            finally:
+                self._callbacks.reset(callbacks_token)
+                self._current.reset(token)
+
+    async def commit(self):
+        """
+        Commits the transaction of the current scope, then runs the callbacks registered within it.
+        """
+        await self._current.get().commit()
+        callbacks = self._callbacks.get()
+        while callbacks:
+            await callbacks.pop(0)()
+
+    async def rollback(self):
+        """
+        Rolls back the transaction of the current scope and drops the callbacks registered within it.
+        """
+        await self._current.get().rollback()
+        self._callbacks.get().clear()
+
+    async def after_commit(self, callback: Callable[[], Awaitable[Any]]):
+        """
+        Runs the callback once the transaction of the current scope is committed, right away outside of a scope. The
+        callback is dropped if the transaction, or the savepoint it was registered in, is rolled back.
+        """
+        callbacks = self._callbacks.get()
+        if callbacks is None:
+            await callback()
+        else:
+            callbacks.append(callback)
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Yields the session of the current scope, or the session of a new scope when there is none.
+        """
+        session = self._current.get()
+        if session is not None:
+            yield session
+            return
+        async with self.scope() as session:
+            yield session
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[AsyncSession]:
+        """
+        Opens a new scope, or a savepoint of the transaction of the current scope rolled back alone on errors.
+        """
+        session = self._current.get()
+        if session is None:
+            async with self.scope() as session:
+                yield session
+            return
+        outer = self._callbacks.get()
+        callbacks = []
+        token = self._callbacks.set(callbacks)
+        try:
+            async with session.begin_nested():
+                yield session
+        finally:
+            self._callbacks.reset(token)
+        outer.extend(callbacks)
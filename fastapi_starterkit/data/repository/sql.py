@@ -1,108 +1,356 @@
-import asyncio
-from typing import TypeVar, Generic, get_args, Iterable, List, Optional, Any
+import collections
+import json
+import operator
+import time
+from contextlib import asynccontextmanager
+from typing import TypeVar, Generic, get_args, Iterable, List, Optional, Any, Dict, AsyncIterator, Union, Tuple, \
+    Callable, Awaitable
 
-from sqlalchemy import select, func, delete
+from pydantic import parse_obj_as, ValidationError
+from sqlalchemy import select, func, delete, update, tuple_, and_, or_, inspect, Index, UniqueConstraint, \
+    PrimaryKeyConstraint
+from sqlalchemy.dialects.postgresql import insert as pg_insert, Insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.sql import Select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import make_transient_to_detached, load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.sql import Select, ColumnElement
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.expression import Executable, ClauseElement
 
 from fastapi_starterkit.data.domain.entity import Entity
-from fastapi_starterkit.data.domain.pageable import PageRequest, Page
-from fastapi_starterkit.data.domain.sort import Sort
+from fastapi_starterkit.data.domain.filter import Filter, Criterion, Operator, LogicalOperator
+from fastapi_starterkit.data.domain.pageable import PageRequest, Page, Cursor, Slice, CountStrategy
+from fastapi_starterkit.data.domain.sort import Sort, Order
 from fastapi_starterkit.data.repository.core import PagingRepository
+from fastapi_starterkit.data.repository.routing import stick_to_primary
+from fastapi_starterkit.data.repository.session import SessionProvider
 from fastapi_starterkit.utils import validate_type_arg
 
 T = TypeVar("T", bound=Entity)
 
+_OPERATORS = {
+    Operator.EQ: operator.eq,
+    Operator.NE: operator.ne,
+    Operator.IN: lambda attr, value: attr.in_(value),
+    Operator.GT: operator.gt,
+    Operator.GTE: operator.ge,
+    Operator.LT: operator.lt,
+    Operator.LTE: operator.le,
+    Operator.LIKE: lambda attr, value: attr.like(value),
+}
+
+
+class _Explain(Executable, ClauseElement):
+    """
+    EXPLAIN statement of a select, used to read the row estimate of the query planner.
+    """
+    inherit_cache = False
+
+    def __init__(self, stmt: Select):
+        self.stmt = stmt
+
+
+@compiles(_Explain, "postgresql")
+def _compile_explain(element: _Explain, compiler, **kw) -> str:
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.stmt, **kw)}"
+
 
 class SqlRepository(Generic[T], PagingRepository):
     """
     SQL repository.
 
     T: the type of object handled by the repository, must be `fastapi_starterkit.data.domain.entity.Entity`.
+
+    window_count: compute exact page totals with a `count(*) OVER ()` column of the page query instead of a separate
+    count query, requires a database supporting window functions.
+
+    bulk_chunk_size: the amount of entities written per statement by `save_all`.
+
+    The entities are read and written with the session of the current scope of the given SessionProvider. Writes are
+    flushed, they are committed once with the transaction of the scope.
     """
+    window_count: bool = False
+    bulk_chunk_size: int = 1000
 
-    def __init__(self):
+    def __init__(self, sessions: SessionProvider):
+        self.sessions = sessions
         self.model = get_args(self.__orig_bases__[0])[0]
         validate_type_arg(self.model, Entity)
+        mapper = inspect(self.model)
+        self.sortable_keys = frozenset(mapper.column_attrs.keys())
+        # an index only supports sorts on its leading column
+        leading_columns = set()
+        for index in [*self.model.__table__.indexes, *self.model.__table__.constraints]:
+            if isinstance(index, (Index, UniqueConstraint, PrimaryKeyConstraint)) and len(index.columns) > 0:
+                leading_columns.add(list(index.columns)[0])
+        self.indexed_keys = frozenset(p.key for p in mapper.column_attrs if p.columns[0] in leading_columns)
 
-    async def count(self, session: AsyncSession) -> int:
+    async def count(self, filter: Filter = None) -> int:
         """
-        Returns the number of entities available.
+        Returns the number of entities available meeting the given filter.
         """
-        return await self._count(session, select(self.model))
+        async with self.sessions.session() as session:
+            return await self._count(session, self._apply_filter(select(self.model), filter))
 
-    async def delete_all(self, session: AsyncSession):
+    async def delete_all(self):
         """
         Deletes all entities.
         """
-        await session.execute(delete(self.model))
-        await session.commit()
+        async with self.sessions.session() as session:
+            await session.execute(delete(self.model))
 
-    async def delete_all_by_id(self, session: AsyncSession, ids: Iterable[id]):
+    async def delete_all_by_id(self, ids: Iterable[id]):
         """
         Deletes all entities with the given IDs.
         """
-        await session.execute(delete(self.model).where(self.model.id.in_(ids)))
-        await session.commit()
+        async with self.sessions.session() as session:
+            await session.execute(delete(self.model).where(self.model.id.in_(ids)))
 
-    async def delete_by_id(self, session: AsyncSession, id: int):
+    async def delete_by_id(self, id: int, filter: Filter = None) -> bool:
         """
-        Deletes the entity with the given id.
+        Deletes the entity with the given id if it meets the given filter, returns whether an entity was deleted.
         """
-        await session.execute(delete(self.model).where(self.model.id == id))
-        await session.commit()
+        stmt = self._apply_filter(delete(self.model).where(self.model.id == id), filter)
+        async with self.sessions.session() as session:
+            return (await session.execute(stmt)).rowcount > 0
 
-    async def exists_by_id(self, session: AsyncSession, id: int) -> bool:
+    async def exists_by_id(self, id: int) -> bool:
         """
         Returns whether an entity with the given id exists.
         """
-        return (await self._count(session, select(self.model).where(self.model.id == id))) > 0
+        async with self.sessions.session() as session:
+            return (await self._count(session, select(self.model).where(self.model.id == id))) > 0
+
+    async def find_all(self, sort: Sort = None, filter: Filter = None) -> List[T]:
+        """
+        Returns all entities meeting the given filter sorted by the given options.
+        """
+        async with self.sessions.session() as session:
+            return await self._all(session, self._apply_filter(select(self.model), filter), sort)
 
-    async def find_all(self, session: AsyncSession, sort: Sort = None) -> List[T]:
+    async def find_page(
+            self,
+            page_request: PageRequest,
+            sort: Sort = None,
+            filter: Filter = None,
+            fields: List[str] = None
+    ) -> Page[T]:
         """
-        Returns all entities sorted by the given options.
+        Returns a Page of entities meeting the paging restriction and the given filter, only the given fields are
+        loaded if any.
         """
-        return await self._all(session, select(self.model), sort)
+        stmt = self._apply_fields(self._apply_filter(select(self.model), filter), fields, sort)
+        async with self.sessions.session() as session:
+            return await self._page(session, stmt, page_request, sort)
 
-    async def find_page(self, session: AsyncSession, page_request: PageRequest, sort: Sort = None) -> Page[T]:
+    async def find_slice(
+            self,
+            cursor: Optional[Cursor],
+            size: int,
+            sort: Sort = None,
+            filter: Filter = None,
+            fields: List[str] = None
+    ) -> Slice[T]:
         """
-        Returns a Page of entities meeting the paging restriction.
+        Returns a Slice of entities meeting the given filter following the given cursor, seeking through the sort keys
+        instead of skipping rows. Only the given fields are loaded if any.
         """
-        return await self._page(session, select(self.model), page_request)
+        stmt = self._apply_fields(self._apply_filter(select(self.model), filter), fields, sort)
+        async with self.sessions.session() as session:
+            return await self._slice(session, stmt, cursor, size, sort)
 
-    async def find_all_by_id(self, session: AsyncSession, ids: Iterable[id]) -> List[T]:
+    async def stream_all(self, sort: Sort = None, batch_size: int = 1000, filter: Filter = None) -> AsyncIterator[T]:
+        """
+        Yields all entities meeting the given filter sorted by the given options, fetching `batch_size` rows at a time
+        from a server side cursor. The session stays in use until the iteration ends.
+        """
+        stmt = self._apply_filter(select(self.model), filter)
+        stmt = self._apply_order_by(stmt, sort).execution_options(yield_per=batch_size)
+        async with self.sessions.session() as session:
+            result = await session.stream(stmt)
+            async for partition in result.scalars().partitions(batch_size):
+                for model in partition:
+                    yield model
+
+    async def find_all_by_id(self, ids: Iterable[id]) -> List[T]:
         """
         Returns all entities with the given IDs.
         """
-        return await self._all(session, select(self.model).where(self.model.id.in_(ids)))
+        async with self.sessions.session() as session:
+            return await self._all(session, select(self.model).where(self.model.id.in_(ids)))
 
-    async def find_by_id(self, session: AsyncSession, id: id) -> Optional[T]:
+    async def find_by_id(self, id: id, fields: List[str] = None, for_update: bool = False) -> Optional[T]:
         """
-        Returns an entity by its id.
+        Returns an entity by its id, only the given fields are loaded if any. With `for_update`, the row is read from
+        the primary and locked until the end of the transaction.
         """
-        return await self._get(session, id)
+        async with self.sessions.session() as session:
+            if fields is not None:
+                stmt = self._apply_fields(select(self.model), fields).where(self.model.id == id)
+                if for_update:
+                    stmt = stmt.with_for_update().execution_options(populate_existing=True)
+                return await self._one_or_none(session, stmt)
+            if for_update:
+                return await session.get(self.model, id, with_for_update=True, populate_existing=True)
+            return await self._get(session, id)
 
-    async def save(self, session: AsyncSession, model: T) -> T:
+    async def save(self, model: T) -> T:
         """
         Saves a given entity.
         """
         if not isinstance(model, Entity):
             raise ValueError(f"type {type(model)} not handled by repository.")
-        session.add(model)
-        await session.commit()
-        await session.refresh(model)
-        return model
+        async with self.sessions.session() as session:
+            session.add(model)
+            await session.flush()
+            await session.refresh(model)
+            return model
 
-    async def save_all(self, session: AsyncSession, models: Iterable[T]) -> List[T]:
+    async def save_all(self, models: Iterable[T], chunk_size: int = None) -> List[T]:
         """
-        Saves all given entities.
+        Saves all given entities, `chunk_size` entities at a time. On PostgreSQL every chunk is written with a single
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING statement, after allocating the ids of its new entities. An id
+        can only appear once in a chunk there.
         """
+        models = list(models)
         if any(not isinstance(m, Entity) for m in models):
             raise ValueError(f"one of type in the list of model is not handled by repository.")
+        chunk_size = chunk_size or self.bulk_chunk_size
+        saved = []
+        async with self.sessions.session() as session:
+            for i in range(0, len(models), chunk_size):
+                chunk = models[i:i + chunk_size]
+                if session.bind.dialect.name == "postgresql":
+                    saved.extend(await self._upsert_returning(session, chunk))
+                else:
+                    saved.extend(await self._flush_all(session, chunk))
+        return saved
+
+    async def update_by_id(self, id: Any, values: Dict[str, Any], filter: Filter = None) -> Optional[T]:
+        """
+        Updates the given attributes of the entity with the given id if it meets the given filter, returns the updated
+        entity or None if it does not exist or does not meet the filter. Uses UPDATE ... RETURNING on databases
+        supporting it.
+        """
+        mapper = inspect(self.model)
+        columns = {mapper.attrs[k].columns[0].key: v for k, v in values.items() if k in mapper.column_attrs}
+        table = self.model.__table__
+        stmt = self._apply_filter(update(table).where(table.c.id == id).values(columns), filter)
+        async with self.sessions.session() as session:
+            if session.bind.dialect.full_returning:
+                row = (await session.execute(stmt.returning(*table.columns))).first()
+                return await self._merge_row(session, row) if row else None
+            updated = (await session.execute(stmt)).rowcount > 0
+            return await session.get(self.model, id, populate_existing=True) if updated else None
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """
+        Runs the calls made within the block in one transaction, committed at exit and rolled back on errors. Within a
+        scope, the block is a savepoint of the transaction of the scope.
+        """
+        async with self.sessions.transaction():
+            yield
+
+    async def after_commit(self, callback: Callable[[], Awaitable[Any]]):
+        await self.sessions.after_commit(callback)
+
+    async def _flush_all(self, session: AsyncSession, models: List[T]) -> List[T]:
         session.add_all(models)
-        await session.commit()
-        await asyncio.gather(*[session.refresh(m) for m in models])
-        return list(models)
+        await session.flush()
+        # reload server generated values with one query instead of a refresh per entity
+        stmt = select(self.model).where(self.model.id.in_([m.id for m in models]))
+        await session.execute(stmt.execution_options(populate_existing=True))
+        return models
+
+    async def _upsert_returning(self, session: AsyncSession, models: List[T]) -> List[T]:
+        """
+        Writes the entities with INSERT ... ON CONFLICT DO UPDATE ... RETURNING statements and gives them the returned
+        values, as a flush would. The entities are returned in the given order.
+        """
+        counts = collections.Counter(m.id for m in models if m.id is not None)
+        duplicates = [id for id, count in counts.items() if count > 1]
+        if duplicates:
+            # a row can't be upserted twice by one statement
+            raise ValueError(f"Entities with the same id can't be saved in one chunk: {duplicates}")
+        new_ids = iter(await self._next_ids(session, len(models) - sum(counts.values())))
+        ids = [m.id if m.id is not None else next(new_ids) for m in models]
+        rows = {}
+        for stmt in self._upsert_statements(models, ids):
+            for row in (await session.execute(stmt)).all():
+                rows[row._mapping[self.model.__table__.c.id]] = row
+        # PostgreSQL does not return the rows in the order of the values, they are matched by id
+        return [self._adopt_row(session, model, rows[id]) for model, id in zip(models, ids)]
+
+    async def _next_ids(self, session: AsyncSession, count: int) -> List[Any]:
+        """
+        Allocates ids to new entities from the sequence of the id column, so that they can be matched with the rows
+        returned by an upsert.
+        """
+        if count == 0:
+            return []
+        # nextval writes the sequence, it runs on the primary
+        stick_to_primary(time.time() + self.sessions.sticky_window)
+        table = self.model.__table__
+        sequence = func.pg_get_serial_sequence(table.fullname, table.c.id.name)
+        stmt = select(func.nextval(sequence)).select_from(func.generate_series(1, count))
+        ids = (await session.execute(stmt)).scalars().all()
+        if None in ids:
+            raise ValueError(f"Ids of new entities can't be allocated, {table.fullname}.id has no sequence")
+        return ids
+
+    def _upsert_statements(self, models: List[T], ids: List[Any]) -> List[Insert]:
+        """
+        Returns the upsert statements writing the given entities with the given ids.
+        """
+        mapper = inspect(self.model)
+        rows = []
+        for model, id in zip(models, ids):
+            # unset values of new entities are left to the column defaults
+            row = {
+                p.columns[0].key: getattr(model, p.key) for p in mapper.column_attrs
+                if model.id is not None or getattr(model, p.key) is not None
+            }
+            rows.append({"id": id, **row})
+        # a multi-row VALUES clause needs the same columns on every row
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(row)
+        statements = []
+        for keys, group in groups.items():
+            stmt = pg_insert(self.model.__table__).values(group)
+            if len(keys) > 1:
+                # rows with only an id are new entities, they have ids from the sequence and no conflicts
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[self.model.__table__.c.id],
+                    set_={k: stmt.excluded[k] for k in keys if k != "id"}
+                )
+            statements.append(stmt.returning(*self.model.__table__.columns))
+        return statements
+
+    def _adopt_row(self, session: AsyncSession, model: T, row: Any) -> T:
+        """
+        Gives an entity the values of a row written by a core statement and attaches it to the session.
+        """
+        mapper = inspect(self.model)
+        for p in mapper.column_attrs:
+            set_committed_value(model, p.key, row._mapping[p.columns[0]])
+        state = inspect(model)
+        if state.transient:
+            make_transient_to_detached(model)
+        if state.detached:
+            session.add(model)
+        return model
+
+    async def _merge_row(self, session: AsyncSession, row: Any) -> T:
+        """
+        Returns the session entity holding the values of a row returned by a core statement.
+        """
+        mapper = inspect(self.model)
+        model = self.model(**{p.key: row._mapping[p.columns[0]] for p in mapper.column_attrs})
+        make_transient_to_detached(model)
+        return await session.merge(model, load=False)
 
     async def _get(self, session: AsyncSession, pk: Any) -> Optional[T]:
         return await session.get(self.model, pk)
@@ -124,23 +372,139 @@ class SqlRepository(Generic[T], PagingRepository):
         return (await session.execute(stmt)).unique().scalars().one_or_none()
 
     async def _count(self, session: AsyncSession, stmt: Select) -> int:
-        count_query = stmt.with_only_columns(func.count(self.model.id))
+        # PostgreSQL refuses an ORDER BY on columns of an aggregate query
+        count_query = stmt.order_by(None).with_only_columns(func.count(self.model.id))
         return (await session.execute(count_query)).scalar()
 
+    async def _estimated_count(self, session: AsyncSession, stmt: Select) -> int:
+        """
+        Returns the amount of rows of the statement estimated by the query planner, falls back to an exact count on
+        dialects without planner statistics.
+        """
+        if session.bind.dialect.name != "postgresql":
+            return await self._count(session, stmt)
+        plan = (await session.execute(_Explain(stmt.order_by(None)))).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
     async def _page(
             self, session: AsyncSession, stmt: Select, page_request: PageRequest, sort: Optional[Sort] = None
     ) -> Page[T]:
         stmt = self._apply_order_by(stmt, sort)
-        count = await self._count(session, stmt.offset(None).limit(None))
-        all = await self._all(session, stmt.offset(page_request.offset()).limit(page_request.size))
+        stmt = stmt.offset(page_request.offset())
+        if page_request.count in (CountStrategy.NONE, CountStrategy.HAS_NEXT):
+            # one more row tells whether a next page exists without counting
+            all = await self._all(session, stmt.limit(page_request.size + 1))
+            has_more = len(all) > page_request.size
+            return Page(content=all[:page_request.size], page_request=page_request, has_more=has_more)
+        if page_request.count == CountStrategy.EXACT and self.window_count:
+            counted = stmt.add_columns(func.count().over()).limit(page_request.size)
+            rows = (await session.execute(counted)).unique().all()
+            # a page past the end has no row carrying the total
+            if rows or page_request.offset() == 0:
+                total = rows[0][1] if rows else 0
+                return Page(content=[r[0] for r in rows], page_request=page_request, total_elements=total)
+        count = None
+        if page_request.count == CountStrategy.EXACT:
+            count = await self._count(session, stmt.offset(None).limit(None))
+        elif page_request.count == CountStrategy.ESTIMATED:
+            count = await self._estimated_count(session, stmt.offset(None).limit(None))
+        all = await self._all(session, stmt.limit(page_request.size))
         return Page(content=all, page_request=page_request, total_elements=count)
 
+    async def _slice(
+            self, session: AsyncSession, stmt: Select, cursor: Optional[Cursor], size: int, sort: Optional[Sort] = None
+    ) -> Slice[T]:
+        self.validate_sort(sort)
+        orders = self._keyset_orders(sort)
+        if cursor is not None:
+            stmt = stmt.where(self._keyset_criteria(orders, cursor))
+        content = await self._all(session, stmt.limit(size + 1), Sort(orders=orders))
+        next_cursor = None
+        if len(content) > size:
+            content = content[:size]
+            last = content[-1]
+            next_cursor = Cursor(values=[getattr(last, o.key) for o in orders[:-1]], id=last.id)
+        return Slice(content=content, size=size, cursor=cursor, next_cursor=next_cursor)
+
+    def _keyset_criteria(self, orders: List[Order], cursor: Cursor) -> ColumnElement:
+        """
+        Returns the criteria selecting the rows positioned after the given cursor.
+        """
+        if len(cursor.values) != len(orders) - 1:
+            raise ValueError("Cursor does not match the sort")
+        attrs = [getattr(self.model, o.key) for o in orders]
+        values = [self._column_value(a, v) for a, v in zip(attrs, [*cursor.values, cursor.id])]
+        if all(o.direction == orders[0].direction for o in orders):
+            # row values comparison can be resolved with a single index seek
+            if orders[0].direction.is_ascending():
+                return tuple_(*attrs) > tuple_(*values)
+            return tuple_(*attrs) < tuple_(*values)
+        clauses = []
+        for i, order in enumerate(orders):
+            equals = [attrs[j] == values[j] for j in range(i)]
+            after = attrs[i] > values[i] if order.direction.is_ascending() else attrs[i] < values[i]
+            clauses.append(and_(*equals, after))
+        return or_(*clauses)
+
+    @staticmethod
+    def _column_value(attr: Any, value: Any) -> Any:
+        """
+        Converts a value decoded from a cursor or a query parameter to the python type of the given column.
+        """
+        try:
+            return parse_obj_as(attr.type.python_type, value)
+        except NotImplementedError:
+            return value
+        except ValidationError:
+            raise ValueError(f"Invalid value for {attr.key}")
+
+    def _apply_filter(self, stmt: Union[Select, UpdateBase], filter: Optional[Filter]) -> Union[Select, UpdateBase]:
+        """
+        Returns a new statement with the given filter applied as WHERE criteria.
+        """
+        if filter is None or not filter.criteria:
+            return stmt
+        return stmt.where(self._filter_criteria(filter))
+
+    def _filter_criteria(self, filter: Union[Filter, Criterion]) -> ColumnElement:
+        """
+        Returns the criteria of a filter or of a single criterion.
+        """
+        if isinstance(filter, Filter):
+            clauses = [self._filter_criteria(c) for c in filter.criteria]
+            return and_(*clauses) if filter.operator == LogicalOperator.AND else or_(*clauses)
+        if filter.key not in inspect(self.model).column_attrs:
+            raise ValueError(f"Unknown filter key {filter.key}")
+        attr = getattr(self.model, filter.key)
+        if filter.operator == Operator.LIKE:
+            value = str(filter.value)
+        elif filter.operator == Operator.IN:
+            value = [self._column_value(attr, v) for v in filter.value]
+        else:
+            value = self._column_value(attr, filter.value)
+        return _OPERATORS[filter.operator](attr, value)
+
+    def _apply_fields(self, stmt: Select, fields: Optional[List[str]], sort: Optional[Sort] = None) -> Select:
+        """
+        Returns a new selectable loading only the columns of the given fields, the id and the sort keys. Fields which
+        are not columns are ignored.
+        """
+        if fields is None:
+            return stmt
+        mapper = inspect(self.model)
+        sort_keys = [o.key for o in sort.orders] if sort else []
+        keys = dict.fromkeys(["id", *fields, *sort_keys])
+        return stmt.options(load_only(*[getattr(self.model, k) for k in keys if k in mapper.column_attrs]))
+
     def _apply_order_by(self, stmt: Select, sort: Optional[Sort]) -> Select:
         """
         Returns a new selectable with the given list of ORDER BY criteria applied.
         """
         if sort is None:
             return stmt
+        self.validate_sort(sort)
         clauses = []
         for order in sort.orders:
             attr = getattr(self.model, order.key)
@@ -0,0 +1,23 @@
+"""
+SQL backend of the demo application of `fastapi_starterkit.main`, imported when the application is created so that
+importing `main` does not load SQLAlchemy. The model is declared once per process, the applications created share it.
+"""
+from sqlalchemy import Column, Integer, String
+
+from fastapi_starterkit.crud.mapper import BaseMapper
+from fastapi_starterkit.data.domain.entity import Entity
+from fastapi_starterkit.data.repository.sql import SqlRepository
+from fastapi_starterkit.main import TestReadSchema, TestSchema
+
+
+class DemoModel(Entity):
+    id: int = Column(Integer, primary_key=True, index=True)
+    value: str = Column(String, nullable=False)
+
+
+class DemoRepository(SqlRepository[DemoModel]):
+    pass
+
+
+class DemoMapper(BaseMapper[DemoModel, TestReadSchema, TestSchema]):
+    pass
@@ -1,53 +1,41 @@
-import uvicorn
 from fastapi import FastAPI
 from pydantic import BaseModel
-from sqlalchemy import Column, Integer, String
 
 from fastapi_starterkit.crud.endpoints import CRUDEndpoints, CRUDApiDoc, ApiDoc
-from fastapi_starterkit.data.domain.entity import Entity
 from fastapi_starterkit.web.schema import PageSchema
 
 
-class TestService:
-
-    def find(self):
-        return []
-
-
-serv = TestService()
-
-
-class TestModel(Entity):
-    id: int = Column(Integer, primary_key=True, index=True)
-    value: str = Column(String, nullable=False)
-
-
 class TestSchema(BaseModel):
     value: str
 
 
-class TestEndpoint(CRUDEndpoints[TestSchema, TestSchema, TestModel, int]):
+class TestReadSchema(TestSchema):
+    id: int
+
+
+class TestEndpoint(CRUDEndpoints[TestReadSchema, TestSchema, int]):
+    prefix = "/test"
     override_api_doc = CRUDApiDoc(
         read_all=ApiDoc(
-            response_model=PageSchema[TestSchema],
+            response_model=PageSchema[TestReadSchema],
             summary="Retrieve a subset of tests",
             description="Retrieve a subset of tests",
             tags=["Test"],
         ),
         read_one=ApiDoc(
-            response_model=TestSchema,
+            response_model=TestReadSchema,
             summary="Retrieve a specific test",
             description="Retrieve a specific test",
             tags=["Test"],
         ),
         create=ApiDoc(
-            response_model=TestSchema,
+            response_model=TestReadSchema,
             summary="Create a test",
             description="Create a test",
             tags=["Test"],
         ),
         update=ApiDoc(
-            response_model=TestSchema,
+            response_model=TestReadSchema,
             summary="Update a test",
             description="Update a test",
             tags=["Test"],
@@ -59,16 +47,34 @@ class TestEndpoint(CRUDEndpoints[TestSchema, TestSchema, TestModel, int]):
         ),
     )
 
-    def __init__(self, service: TestService):
-        super().__init__(service, prefix="/test")
 
+def create_app(database_url: str = "sqlite+aiosqlite:///./test.db") -> FastAPI:
+    # the demo runs on the SQL backend, it is only imported when the app is created
+    from fastapi_starterkit.crud.service import CRUDService
+    from fastapi_starterkit.data.domain.entity import Entity
+    from fastapi_starterkit.data.repository.session import create_engine, SessionProvider
+    from fastapi_starterkit.demo import DemoRepository, DemoMapper
+    from fastapi_starterkit.web.middleware import SessionScopeMiddleware
 
-test_endpoint = TestEndpoint(serv)
+    engine = create_engine(database_url)
+    sessions = SessionProvider(engine)
+    app = FastAPI()
+    app.add_middleware(SessionScopeMiddleware, sessions=sessions)
+    app.include_router(TestEndpoint(CRUDService(DemoRepository(sessions)), DemoMapper()).router)
 
+    @app.on_event("startup")
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Entity.metadata.create_all)
 
-app = FastAPI()
-app.include_router(test_endpoint.router)
+    @app.on_event("shutdown")
+    async def dispose_engine():
+        await engine.dispose()
+
+    return app
 
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    import uvicorn
+
+    uvicorn.run(create_app(), host="0.0.0.0", port=8000)
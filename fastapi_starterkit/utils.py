@@ -1,4 +1,6 @@
-from typing import Any, TypeVar
+import importlib
+import sys
+from typing import Any, TypeVar, Dict, Callable, List, Tuple
 
 
 def validate_type_arg(type_arg: Any, expected_type: Any = None):
@@ -6,3 +8,24 @@ def validate_type_arg(type_arg: Any, expected_type: Any = None):
         raise ValueError("Missing type")
     if expected_type is not None and not issubclass(type_arg, expected_type):
         raise ValueError(f"Model type {type_arg} is not {expected_type.__module__}.{expected_type.__name__}")
+
+
+def lazy_attributes(
+        module_name: str, attributes: Dict[str, str]
+) -> Tuple[Callable[[str], Any], Callable[[], List[str]]]:
+    """
+    Returns the module `__getattr__` and `__dir__` functions importing the given attributes, mapped to the module
+    defining them, on first access. The imported attributes are then set on the module.
+    """
+    def __getattr__(name: str) -> Any:
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError(f"module {module_name!r} has no attribute {name!r}")
+        value = getattr(importlib.import_module(module), name)
+        setattr(sys.modules[module_name], name, value)
+        return value
+
+    def __dir__() -> List[str]:
+        return sorted({*vars(sys.modules[module_name]), *attributes})
+
+    return __getattr__, __dir__
@@ -0,0 +1,65 @@
+import functools
+from typing import Any, ClassVar, Type, Callable, Coroutine
+
+from fastapi.routing import APIRoute
+from starlette.requests import Request
+from starlette.responses import Response, JSONResponse
+
+from fastapi_starterkit.web.encoder import JSONCodec
+
+
+class CodecRequest(Request):
+    """
+    Request parsing its JSON body with a codec.
+    """
+    codec: ClassVar[JSONCodec]
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            self._json = self.codec.loads(await self.body())
+        return self._json
+
+
+class CodecResponse(JSONResponse):
+    """
+    JSON response serialized with a codec, documented in OpenAPI like a JSONResponse.
+    """
+    media_type = "application/json"
+    codec: ClassVar[JSONCodec]
+
+    def render(self, content: Any) -> bytes:
+        return self.codec.dumps(content)
+
+
+class CodecRoute(APIRoute):
+    """
+    Route parsing the JSON bodies of its requests with a codec.
+    """
+    codec: ClassVar[JSONCodec]
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        handler = super().get_route_handler()
+        request_class = codec_request_class(self.codec)
+
+        async def codec_route_handler(request: Request) -> Response:
+            return await handler(request_class(request.scope, request.receive))
+
+        return codec_route_handler
+
+
+# the classes are created once per codec
+
+
+@functools.lru_cache(maxsize=None)
+def codec_request_class(codec: JSONCodec) -> Type[CodecRequest]:
+    return type(f"{codec.__class__.__name__}Request", (CodecRequest,), {"codec": codec})
+
+
+@functools.lru_cache(maxsize=None)
+def codec_response_class(codec: JSONCodec) -> Type[CodecResponse]:
+    return type(f"{codec.__class__.__name__}Response", (CodecResponse,), {"codec": codec})
+
+
+@functools.lru_cache(maxsize=None)
+def codec_route_class(codec: JSONCodec) -> Type[CodecRoute]:
+    return type(f"{codec.__class__.__name__}Route", (CodecRoute,), {"codec": codec})
@@ -8,6 +8,8 @@ from fastapi.types import DecoratedCallable
 from starlette.responses import JSONResponse, Response
 from starlette.routing import BaseRoute
 
+from fastapi_starterkit.web.encoder import JSONCodec
+
 
 # def rest_router(prefix=""):
 #     def wrapper(cls):
@@ -48,6 +50,10 @@ from starlette.routing import BaseRoute
 
 
 def request(path: str, methods: List[str], **kwargs: Any):
+    """
+    Marks a function as a route of its RestEndpoints class. A `codec` option parses the body and renders the response
+    of the route instead of the codec of the class.
+    """
     def wrap(func):
         setattr(func, '_request', {"path": path, "methods": methods, **kwargs})
         return func
@@ -78,6 +84,7 @@ def get(
         name: Optional[str] = None,
         callbacks: Optional[List[BaseRoute]] = None,
         openapi_extra: Optional[Dict[str, Any]] = None,
+        codec: Optional[JSONCodec] = None,
         **kwargs
 ) -> Callable[[DecoratedCallable], DecoratedCallable]:
     return request(
@@ -104,6 +111,7 @@ def get(
         name=name,
         callbacks=callbacks,
         openapi_extra=openapi_extra,
+        codec=codec,
         **kwargs,)
 
 
@@ -131,6 +139,7 @@ def post(
         name: Optional[str] = None,
         callbacks: Optional[List[BaseRoute]] = None,
         openapi_extra: Optional[Dict[str, Any]] = None,
+        codec: Optional[JSONCodec] = None,
         **kwargs: Any
 ) -> Callable[[DecoratedCallable], DecoratedCallable]:
     return request(
@@ -157,6 +166,7 @@ def post(
         name=name,
         callbacks=callbacks,
         openapi_extra=openapi_extra,
+        codec=codec,
         **kwargs)
 
 
@@ -184,6 +194,7 @@ def put(
         name: Optional[str] = None,
         callbacks: Optional[List[BaseRoute]] = None,
         openapi_extra: Optional[Dict[str, Any]] = None,
+        codec: Optional[JSONCodec] = None,
         **kwargs: Any
 ) -> Callable[[DecoratedCallable], DecoratedCallable]:
     return request(
@@ -210,6 +221,7 @@ def put(
         name=name,
         callbacks=callbacks,
         openapi_extra=openapi_extra,
+        codec=codec,
         **kwargs)
 
 
@@ -237,6 +249,7 @@ def patch(
         name: Optional[str] = None,
         callbacks: Optional[List[BaseRoute]] = None,
         openapi_extra: Optional[Dict[str, Any]] = None,
+        codec: Optional[JSONCodec] = None,
         **kwargs: Any
 ) -> Callable[[DecoratedCallable], DecoratedCallable]:
     return request(
@@ -263,6 +276,7 @@ def patch(
         name=name,
         callbacks=callbacks,
         openapi_extra=openapi_extra,
+        codec=codec,
         **kwargs)
 
 
@@ -290,6 +304,7 @@ def delete(
         name: Optional[str] = None,
         callbacks: Optional[List[BaseRoute]] = None,
         openapi_extra: Optional[Dict[str, Any]] = None,
+        codec: Optional[JSONCodec] = None,
         **kwargs: Any
 ) -> Callable[[DecoratedCallable], DecoratedCallable]:
     return request(
@@ -316,4 +331,5 @@ def delete(
         name=name,
         callbacks=callbacks,
         openapi_extra=openapi_extra,
+        codec=codec,
         **kwargs)
@@ -1,16 +1,32 @@
-from typing import Optional
+import functools
+from typing import Optional, List
 
-from fastapi import Query
+from fastapi import Query, HTTPException, status
 
-from fastapi_starterkit.data.domain.pageable import PageRequest
+from fastapi_starterkit.data.domain.filter import Filter, Criterion, Operator
+from fastapi_starterkit.data.domain.pageable import PageRequest, CountStrategy
 from fastapi_starterkit.data.domain.sort import Sort, Direction, Order
 
 
 async def pageable_parameters(
         page: int = Query(default=0, description="Page index, must not be negative.", ge=0),
-        size: int = Query(default=20, description="The size of the page to be returned, must be greater than 0.", gt=0)
+        size: int = Query(default=20, description="The size of the page to be returned, must be greater than 0.", gt=0),
+        count: CountStrategy = Query(
+            default=CountStrategy.EXACT,
+            description="How the total amount of items is computed, `has_next` only tells whether a next page exists."
+        )
 ) -> PageRequest:
-    return PageRequest(page=page, size=size)
+    return PageRequest(page, size, count)
+
+
+async def cursor_parameters(
+        cursor: Optional[str] = Query(
+            None,
+            description="Cursor returned by the previous slice, enables keyset pagination. Leave empty for the first "
+                        "slice."
+        )
+) -> Optional[str]:
+    return cursor
 
 
 async def sort_parameters(
@@ -18,10 +34,63 @@ async def sort_parameters(
 ) -> Optional[Sort]:
     if sort is None:
         return None
+    try:
+        return _parse_sort(sort)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_sort(sort: str) -> Sort:
+    """
+    Returns the Sort of a sort parameter, the usual parameters are parsed once and share the same immutable Sort.
+    """
     # format is id.asc,value.des unless we can handle multiple sort query param
     orders = []
     for order_param in sort.split(","):
         split = order_param.split(".")
         direction = Direction.value_of(split[1]) if len(split) > 1 else Direction.ASC
-        orders.append(Order(key=split[0], direction=direction))
-    return Sort(orders=orders)
+        if direction is None:
+            raise ValueError(f"Invalid sort direction {split[1]}")
+        orders.append(Order(split[0], direction))
+    return Sort(orders)
+
+
+async def filter_parameters(
+        filter: Optional[str] = Query(
+            None,
+            description="Filter option, criteria are written `key.operator:value` with the operators eq, ne, in, gt, "
+                        "gte, lt, lte and like. Criteria separated by `,` must all match, groups separated by `;` are "
+                        "alternatives. Values of the `in` operator are separated by `|`, the `like` operator accepts "
+                        "the `%` and `_` wildcards.",
+            example="value.like:foo%,id.gte:10;value.in:bar|baz"
+        )
+) -> Optional[Filter]:
+    if filter is None:
+        return None
+    groups = []
+    for group_param in filter.split(";"):
+        criteria = []
+        for criterion_param in group_param.split(","):
+            path, separator, value = criterion_param.partition(":")
+            key, _, operator_name = path.rpartition(".")
+            operator = Operator.value_of(operator_name)
+            if not separator or not key or operator is None:
+                raise HTTPException(
+                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid filter {criterion_param}"
+                )
+            value = value.split("|") if operator == Operator.IN else value
+            criteria.append(Criterion(key=key, operator=operator, value=value))
+        groups.append(Filter.and_(*criteria))
+    return groups[0] if len(groups) == 1 else Filter.or_(*groups)
+
+
+async def fields_parameters(
+        fields: Optional[str] = Query(
+            None, description="The fields of the resources to return, all the fields if empty.", example="id,value"
+        )
+) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    fields = [f.strip() for f in fields.split(",") if f.strip()]
+    return fields or None
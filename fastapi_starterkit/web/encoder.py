@@ -0,0 +1,103 @@
+import abc
+import json
+import sys
+from typing import Any, Union
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from pydantic.json import ENCODERS_BY_TYPE
+
+from fastapi_starterkit.data.domain.value import ValueObject
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """
+    Converts the objects the JSON encoders can't handle natively the way FastAPI's `jsonable_encoder` does, so that
+    both produce the same documents: models are serialized by alias and with their `json_encoders`, the other types
+    with pydantic's encoders, which write Decimals as numbers.
+    """
+    if isinstance(obj, BaseModel):
+        if obj.__config__.json_encoders:
+            return jsonable_encoder(obj)
+        return obj.dict(by_alias=True)
+    if isinstance(obj, ValueObject):
+        return obj.dict()
+    # ObjectIds only exist once the mongo backend loaded bson, it is not imported for the other backends
+    bson = sys.modules.get("bson")
+    if bson is not None and isinstance(obj, bson.ObjectId):
+        return str(obj)
+    for base in obj.__class__.__mro__[:-1]:
+        encoder = ENCODERS_BY_TYPE.get(base)
+        if encoder is not None:
+            return encoder(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class JSONCodec(abc.ABC):
+    """
+    Interface of the JSON serializers of request bodies and responses. Pydantic models, ObjectIds, datetimes, Decimals,
+    UUIDs, enums and sets are serialized without going through FastAPI's `jsonable_encoder`, into the same documents.
+    """
+
+    @abc.abstractmethod
+    def dumps(self, obj: Any) -> bytes:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """
+        Parses JSON, raises a `json.JSONDecodeError` on invalid documents.
+        """
+        raise NotImplementedError()
+
+
+class StdlibJSONCodec(JSONCodec):
+    """
+    JSONCodec using the json module of the standard library.
+    """
+
+    def dumps(self, obj: Any) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":"), ensure_ascii=False).encode()
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec(JSONCodec):
+    """
+    JSONCodec using orjson, which serializes datetimes, UUIDs and enums natively.
+    """
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def dumps(self, obj: Any) -> bytes:
+        # non string keys are converted like the standard library does
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+
+_STDLIB_CODEC = StdlibJSONCodec()
+_ORJSON_CODEC = OrjsonCodec() if orjson is not None else None
+
+
+def default_codec() -> JSONCodec:
+    """
+    Returns the orjson codec when orjson is installed, the standard library codec otherwise.
+    """
+    return _ORJSON_CODEC if orjson is not None else _STDLIB_CODEC
+
+
+def json_dumps(obj: Any) -> bytes:
+    """
+    Serializes an object to JSON bytes with the default codec.
+    """
+    return default_codec().dumps(obj)
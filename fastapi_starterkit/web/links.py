@@ -0,0 +1,95 @@
+from typing import NamedTuple, Optional, List
+from urllib.parse import quote
+
+from starlette.datastructures import URL
+
+from fastapi_starterkit.data.domain.pageable import Page, Slice
+
+
+class PageInfo(NamedTuple):
+    """
+    Position of a Page, computed once from it.
+
+    Attributes:
+        number         The number of the page
+        size           The size of the page
+        total_pages    The total amount of pages, None if not counted
+        total_elements The total amount of items, None if not counted
+        has_next       Whether a next page exists
+    """
+    number: int
+    size: int
+    total_pages: Optional[int]
+    total_elements: Optional[int]
+    has_next: bool
+
+    @classmethod
+    def of(cls, page: Page) -> "PageInfo":
+        counted = page.total_elements is not None
+        return cls(
+            number=page.number(),
+            size=page.size(),
+            total_pages=page.total_pages() if counted else None,
+            total_elements=page.total_elements,
+            has_next=page.has_next()
+        )
+
+
+class QueryLinks:
+    """
+    Builder of the links to a request URL with one query parameter changed, as web links of a `Link` header
+    (RFC 8288).
+
+    The query is split once, the other parameters are kept as sent, in the same order. The parameter is added at the end
+    if it is missing.
+    """
+
+    def __init__(self, url: URL, param: str):
+        self.param = param
+        self.base = str(url.replace(query=""))
+        self.before: List[str] = []
+        self.after: List[str] = []
+        found = False
+        for piece in url.query.split("&") if url.query else []:
+            if piece.partition("=")[0] == param:
+                found = True
+            elif found:
+                self.after.append(piece)
+            else:
+                self.before.append(piece)
+
+    def uri(self, value: str) -> str:
+        query = "&".join([*self.before, f"{self.param}={quote(value, safe='')}", *self.after])
+        return f"{self.base}?{query}"
+
+    def link(self, value: str, rel: str) -> str:
+        return f"<{self.uri(value)}>; rel=\"{rel}\""
+
+
+def page_links(page_info: PageInfo, url: URL) -> str:
+    """
+    Returns the `Link` header value of a page, with the next, prev, first and last pages when they exist.
+    """
+    links = QueryLinks(url, "page")
+    values = []
+    if page_info.has_next:
+        values.append(links.link(str(page_info.number + 1), "next"))
+    if page_info.number > 0:
+        values.append(links.link(str(page_info.number - 1), "prev"))
+        values.append(links.link("0", "first"))
+    if page_info.has_next and page_info.total_pages is not None:
+        values.append(links.link(str(page_info.total_pages - 1), "last"))
+    return ", ".join(values)
+
+
+def slice_links(page_slice: Slice, url: URL) -> str:
+    """
+    Returns the `Link` header value of a slice, with the next and first slices when they exist.
+    """
+    links = QueryLinks(url, "cursor")
+    values = []
+    if page_slice.has_next():
+        values.append(links.link(page_slice.next_cursor.encode(), "next"))
+    if not page_slice.is_first():
+        values.append(links.link("", "first"))
+    return ", ".join(values)
@@ -0,0 +1,86 @@
+import time
+from http.cookies import SimpleCookie
+from typing import TYPE_CHECKING
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
+
+from fastapi_starterkit.data.repository.routing import primary_until, stick_to_primary
+
+if TYPE_CHECKING:
+    # the SQL backend is only imported by the applications using it
+    from fastapi_starterkit.data.repository.session import SessionProvider
+
+
+class SessionScopeMiddleware:
+    """
+    ASGI middleware running every HTTP request in a scope of the given SessionProvider, so that all the repository calls
+    of a request share one session and one transaction.
+
+    The transaction is committed right before the response is sent when its status is a success, so that a failing
+    commit is answered with an error, and rolled back otherwise. The callbacks registered with `after_commit`, such as
+    cache updates, run after the commit and are dropped on rollbacks. The session stays open while a streamed body is
+    sent.
+    """
+
+    def __init__(self, app: ASGIApp, sessions: "SessionProvider"):
+        self.app = app
+        self.sessions = sessions
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        async with self.sessions.scope():
+            async def send_after_commit(message: Message):
+                if message["type"] == "http.response.start":
+                    if message["status"] < 400:
+                        await self.sessions.commit()
+                    else:
+                        await self.sessions.rollback()
+                await send(message)
+
+            await self.app(scope, receive, send_after_commit)
+
+
+class ReadYourWritesMiddleware:
+    """
+    ASGI middleware sending the reads of a client to the primary database for a while after one of its writes, so that
+    the client sees its writes on the following requests even if the replicas lag behind.
+
+    The time until which the client reads from the primary is kept in a cookie, set on the responses of the requests
+    making a write for the sticky window of the repository. The cookie is not signed, the time it holds is capped to
+    `sticky_window` seconds from now so that a client can't send all its reads to the primary. It should be the
+    largest sticky window of the repositories.
+    """
+
+    def __init__(self, app: ASGIApp, cookie: str = "primary_until", sticky_window: float = 5):
+        self.app = app
+        self.cookie = cookie
+        self.sticky_window = sticky_window
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        try:
+            until = float(cookie_parser(headers.get("cookie", "")).get(self.cookie, 0))
+        except ValueError:
+            until = 0.0
+        until = min(until, time.time() + self.sticky_window)
+        stick_to_primary(until)
+
+        async def send_with_cookie(message: Message):
+            if message["type"] == "http.response.start" and primary_until() > until:
+                cookie = SimpleCookie()
+                cookie[self.cookie] = f"{primary_until():.3f}"
+                cookie[self.cookie]["max-age"] = max(int(primary_until() - time.time()) + 1, 1)
+                cookie[self.cookie]["path"] = "/"
+                cookie[self.cookie]["httponly"] = True
+                cookie[self.cookie]["samesite"] = "lax"
+                MutableHeaders(scope=message).append("set-cookie", cookie.output(header="").strip())
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -1,84 +1,142 @@
 import functools
+import hashlib
 import inspect
-from typing import List, Callable
+from typing import List, Callable, Any, Optional, ClassVar, Dict
 
-from fastapi import APIRouter, Response, Request
+from fastapi import APIRouter, Response, Request, status
+from fastapi.datastructures import DefaultPlaceholder
 
-from fastapi_starterkit.data.domain.pageable import Page
-from fastapi_starterkit.web.schema import PageSchema
+from fastapi_starterkit.data.domain.pageable import Page, Slice
+from fastapi_starterkit.web.codec import codec_route_class, codec_response_class
+from fastapi_starterkit.web.encoder import JSONCodec, default_codec
+from fastapi_starterkit.web.links import PageInfo, page_links, slice_links
+from fastapi_starterkit.web.schema import PageSchema, SliceSchema
 
 
 class RestEndpoints:
     prefix: str = ""
+    # parses the JSON bodies and renders the JSON responses of the routes, orjson when installed
+    codec: JSONCodec = default_codec()
+    # functions of the class decorated as routes, sorted by name, collected once per class
+    _route_functions: ClassVar[List[Callable]] = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        routes = {}
+        for base in reversed(cls.__mro__):
+            for name, member in vars(base).items():
+                if inspect.isfunction(member) and hasattr(member, "_request"):
+                    routes[name] = member
+                else:
+                    # overridden without a route decorator
+                    routes.pop(name, None)
+        cls._route_functions = [routes[name] for name in sorted(routes)]
 
     def __init__(self):
         self.router = APIRouter(prefix=self.prefix)
-        for endpoint in self.endpoints:
-            request = getattr(endpoint, "_request")
-            endpoint = functools.partial(endpoint, self)
-            self.router.add_api_route(endpoint=endpoint, **request)
+        for func in self.endpoints:
+            self.router.add_api_route(endpoint=self._endpoint(func), **self._route_options(func))
 
     @property
     def endpoints(self) -> List[Callable]:
-        return [
-            m[1] for m in inspect.getmembers(self.__class__) if inspect.isfunction(m[1]) if hasattr(m[1], "_request")
-        ]
+        return list(self._route_functions)
+
+    def _endpoint(self, func: Callable) -> Callable:
+        """
+        Returns the endpoint of this instance for a route function, the function itself is shared by all instances and
+        must not be changed.
+        """
+        return functools.partial(func, self)
+
+    def _route_options(self, func: Callable) -> Dict[str, Any]:
+        """
+        Returns the options of the route of a function, with the request and response classes of its codec.
+        """
+        options = dict(getattr(func, "_request"))
+        codec = options.pop("codec", None) or self.codec
+        options["route_class_override"] = codec_route_class(codec)
+        if isinstance(options.get("response_class"), DefaultPlaceholder):
+            options["response_class"] = codec_response_class(codec)
+        return options
 
     def _paginated(self, page: Page, request: Request, response: Response) -> PageSchema:
-        link_header = ""
-        request_uri = str(request.url)
-        if page.has_next():
-            next_page_uri = self._construct_next_page_uri(request_uri, page.number())
-            link_header += self._create_link_header(next_page_uri, "next")
-        if page.has_previous():
-            link_header = self._append_comma_if_necessary(link_header)
-            prev_page_uri = self._construct_prev_page_uri(request_uri, page.number())
-            link_header += self._create_link_header(prev_page_uri, "prev")
-        if not page.is_first():
-            link_header = self._append_comma_if_necessary(link_header)
-            first_page_uri = self._construct_first_page_uri(request_uri, page.number())
-            link_header += self._create_link_header(first_page_uri, "first")
-        if not page.is_last() and page.total_pages() > 1:
-            link_header = self._append_comma_if_necessary(link_header)
-            last_page_uri = self._construct_last_page_uri(request_uri, page.number(), page.total_pages())
-            link_header += self._create_link_header(last_page_uri, "last")
-        response.headers["Link"] = link_header
+        page_info = PageInfo.of(page)
+        response.headers["Link"] = page_links(page_info, request.url)
         return PageSchema(
             content=page.content,
-            page=page.number(),
-            page_size=page.size(),
-            total_pages=page.total_pages(),
-            total_elements=page.total_elements
+            page=page_info.number,
+            page_size=page_info.size,
+            total_pages=page_info.total_pages,
+            total_elements=page_info.total_elements
         )
 
+    def _sliced(self, page_slice: Slice, request: Request, response: Response) -> SliceSchema:
+        response.headers["Link"] = slice_links(page_slice, request.url)
+        return SliceSchema(
+            content=page_slice.content,
+            size=page_slice.size,
+            next_cursor=page_slice.next_cursor.encode() if page_slice.has_next() else None
+        )
+
+    def _json(self, content: Any, response: Response) -> Response:
+        """
+        Returns a response with the content already serialized by the codec, skipping FastAPI response model
+        validation and `jsonable_encoder`. Headers set on the injected response are kept.
+        """
+        return RestEndpoints._json_bytes(self.codec.dumps(content), response)
+
     @staticmethod
-    def _created(model, request: Request, response: Response):
-        request_uri = str(request.url)
-        response.headers["Location"] = f"{request_uri.rstrip('/')}/{model.id}"
-        return model
+    def _json_bytes(body: bytes, response: Response) -> Response:
+        """
+        Returns a response with the given JSON body, headers set on the injected response are kept.
+        """
+        json_response = Response(
+            content=body, status_code=response.status_code or status.HTTP_200_OK, media_type="application/json"
+        )
+        json_response.raw_headers.extend(h for h in response.raw_headers if h[0] != b"content-length")
+        return json_response
 
     @staticmethod
-    def _construct_next_page_uri(request_uri: str, page: int) -> str:
-        return request_uri.replace(f"page={page}", f"page={page + 1}")
+    def _conditional_json(body: bytes, request: Request, response: Response) -> Response:
+        """
+        Returns the JSON body with an ETag computed from its bytes, or a 304 response if the client already has it.
+        """
+        etag = RestEndpoints._body_etag(body)
+        response.headers["ETag"] = etag
+        if RestEndpoints._etag_matches(request.headers.get("If-None-Match"), etag):
+            return RestEndpoints._not_modified(etag)
+        return RestEndpoints._json_bytes(body, response)
 
     @staticmethod
-    def _construct_prev_page_uri(request_uri, page: int) -> str:
-        return request_uri.replace(f"page={page}", f"page={page - 1}")
+    def _body_etag(body: bytes) -> str:
+        return f"\"{hashlib.sha1(body).hexdigest()}\""
 
     @staticmethod
-    def _construct_first_page_uri(request_uri, page: int) -> str:
-        return request_uri.replace(f"page={page}", "page=0")
+    def _etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+        """
+        Returns whether an If-Match or If-None-Match header matches the ETag. If-None-Match uses the weak comparison,
+        weak and strong tags being equivalent. If-Match uses the strong comparison, weak tags never match (RFC 7232).
+        """
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        if not weak:
+            return not etag.startswith("W/") and any(t.strip() == etag for t in header.split(","))
+        opaque_tag = RestEndpoints._opaque_tag(etag)
+        return any(RestEndpoints._opaque_tag(t) == opaque_tag for t in header.split(","))
 
     @staticmethod
-    def _construct_last_page_uri(request_uri, page: int, total_pages: int) -> str:
-        return request_uri.replace(f"page={page}", f"page={total_pages}")
+    def _opaque_tag(etag: str) -> str:
+        etag = etag.strip()
+        return etag[2:] if etag.startswith("W/") else etag
 
     @staticmethod
-    def _append_comma_if_necessary(link_header: str) -> str:
-        if len(link_header) > 0:
-            link_header += ", "
-        return link_header
+    def _not_modified(etag: str) -> Response:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
 
     @staticmethod
-    def _create_link_header(uri: str, rel: str) -> str:
-        return f"<{uri}>; rel=\"{rel}\""
+    def _created(model, request: Request, response: Response):
+        request_uri = str(request.url)
+        response.headers["Location"] = f"{request_uri.rstrip('/')}/{model.id}"
+        return model
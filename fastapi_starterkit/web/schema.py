@@ -1,4 +1,4 @@
-from typing import Generic, TypeVar, List
+from typing import Generic, TypeVar, List, Optional
 
 from pydantic import BaseModel, Field
 
@@ -9,5 +9,11 @@ class PageSchema(Generic[T], BaseModel):
     content: List[T] = Field(description="The content of this page.")
     page: int = Field(description="The number of the current page.")
     page_size: int = Field(description="The size of the page.")
-    total_pages: int = Field(description="The total amount of pages available.")
-    total_elements: int = Field(description="The total amount of items available.")
+    total_pages: Optional[int] = Field(description="The total amount of pages available, null if not counted.")
+    total_elements: Optional[int] = Field(description="The total amount of items available, null if not counted.")
+
+
+class SliceSchema(Generic[T], BaseModel):
+    content: List[T] = Field(description="The content of this slice.")
+    size: int = Field(description="The size of the slice.")
+    next_cursor: Optional[str] = Field(description="The cursor to request the next slice, null on the last one.")
@@ -3,14 +3,14 @@ from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from pydantic import BaseModel
 from sqlalchemy import Column, Integer, String
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
 
 from fastapi_starterkit.crud.endpoints import CRUDEndpoints
 from fastapi_starterkit.crud.mapper import BaseMapper
 from fastapi_starterkit.crud.service import CRUDService
 from fastapi_starterkit.data.domain.entity import Entity
+from fastapi_starterkit.data.repository.session import create_engine, SessionProvider
 from fastapi_starterkit.data.repository.sql import SqlRepository
+from fastapi_starterkit.web.middleware import SessionScopeMiddleware
 
 
 class TestModel(Entity):
@@ -45,33 +45,48 @@ class TestEndpoint(CRUDEndpoints[TestReadSchema, TestCreateSchema, int]):
 
 @pytest.fixture
 async def engine():
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    engine = create_engine("sqlite+aiosqlite:///:memory:")
     async with engine.begin() as conn:
         await conn.run_sync(Entity.metadata.create_all)
     yield engine
-    engine.dispose()
+    await engine.dispose()
 
 
 @pytest.fixture
-async def session(engine):
-    session = AsyncSession(bind=engine, expire_on_commit=False)
-    yield session
-    await session.close()
+def sessions(engine):
+    sessions = SessionProvider(engine)
+    yield sessions
 
 
 @pytest.fixture
-async def persist_models(session):
-    session.add_all([
-        TestModel(value="value 1"),
-        TestModel(value="value 2"),
-        TestModel(value="value 3")
-    ])
-    await session.commit()
+async def replicated_sessions(tmp_path):
+    engines = []
+    for name, count in [("primary", 3), ("replica", 1)]:
+        engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Entity.metadata.create_all)
+        async with SessionProvider(engine).scope() as session:
+            session.add_all([TestModel(value=f"{name} {i}") for i in range(count)])
+        engines.append(engine)
+    # the primary and the replica are not synchronized, so that the database serving a query can be told apart
+    yield lambda sticky_window: SessionProvider(engines[0], read_engines=engines[1:], sticky_window=sticky_window)
+    for engine in engines:
+        await engine.dispose()
 
 
 @pytest.fixture
-def repo():
-    repo = TestRepo()
+async def persist_models(sessions):
+    async with sessions.scope() as session:
+        session.add_all([
+            TestModel(value="value 1"),
+            TestModel(value="value 2"),
+            TestModel(value="value 3")
+        ])
+
+
+@pytest.fixture
+def repo(sessions):
+    repo = TestRepo(sessions)
     yield repo
 
 
@@ -94,8 +109,9 @@ def endpoint(service, mapper):
 
 
 @pytest.fixture
-def app(endpoint):
+def app(endpoint, sessions):
     app = FastAPI()
+    app.add_middleware(SessionScopeMiddleware, sessions=sessions)
     app.include_router(endpoint.router)
     yield app
 
@@ -1,3 +1,19 @@
+import asyncio
+import decimal
+import inspect
+import json
+
+from pydantic import BaseModel, Field
+
+from fastapi_starterkit.cache import MemoryCacheStore
+from fastapi_starterkit.crud.endpoints import CRUDEndpoints, CRUDApiDoc, ApiDoc
+from fastapi_starterkit.web.decorator import get
+from fastapi_starterkit.web.encoder import StdlibJSONCodec
+from fastapi_starterkit.web.schema import PageSchema
+from fastapi_starterkit.crud.mapper import BaseMapper
+from tests.conftest import TestEndpoint, TestReadSchema, TestCreateSchema, TestModel, TestService
+
+
 def test_read_all(client):
     res = client.get("/test/?page=1&size=1&sort=id,value.des")
     assert res.status_code == 200
@@ -17,10 +33,195 @@ def test_read_all(client):
         "<http://testserver/test/?page=2&size=1&sort=id,value.des>; rel=\"next\", "
         "<http://testserver/test/?page=0&size=1&sort=id,value.des>; rel=\"prev\", "
         "<http://testserver/test/?page=0&size=1&sort=id,value.des>; rel=\"first\", "
-        "<http://testserver/test/?page=3&size=1&sort=id,value.des>; rel=\"last\""
+        "<http://testserver/test/?page=2&size=1&sort=id,value.des>; rel=\"last\""
+    )
+
+    res = client.get("/test/?size=1&sort=id,value.des")
+    assert res.headers["Link"] == (
+        "<http://testserver/test/?size=1&sort=id,value.des&page=1>; rel=\"next\", "
+        "<http://testserver/test/?size=1&sort=id,value.des&page=2>; rel=\"last\""
     )
 
 
+def test_read_all_fast_response(endpoint, client):
+    endpoint.fast_response = True
+    res = client.get("/test/?page=1&size=1&sort=id,value.des")
+    assert res.status_code == 200
+    assert res.headers["Content-Type"] == "application/json"
+    assert res.json() == {
+        "content": [
+            {
+                "id": 2,
+                "value": "value 2"
+            }
+        ],
+        "page": 1,
+        "page_size": 1,
+        "total_pages": 3,
+        "total_elements": 3
+    }
+    assert res.headers["Link"].startswith("<http://testserver/test/?page=2&size=1&sort=id,value.des>; rel=\"next\"")
+
+
+def test_read_all_without_count(client):
+    res = client.get("/test/?page=1&size=1&count=has_next")
+    assert res.status_code == 200
+    assert res.json() == {
+        "content": [
+            {
+                "id": 2,
+                "value": "value 2"
+            }
+        ],
+        "page": 1,
+        "page_size": 1,
+        "total_pages": None,
+        "total_elements": None
+    }
+    assert res.headers["Link"] == (
+        "<http://testserver/test/?page=2&size=1&count=has_next>; rel=\"next\", "
+        "<http://testserver/test/?page=0&size=1&count=has_next>; rel=\"prev\", "
+        "<http://testserver/test/?page=0&size=1&count=has_next>; rel=\"first\""
+    )
+
+
+def test_read_all_count_none(client):
+    res = client.get("/test/?page=0&size=2&count=none")
+    assert res.status_code == 200
+    assert res.json()["total_elements"] is None
+    assert res.headers["Link"] == "<http://testserver/test/?page=1&size=2&count=none>; rel=\"next\""
+
+    res = client.get("/test/?page=1&size=2&count=none")
+    assert len(res.json()["content"]) == 1
+    assert "next" not in res.headers.get("Link", "")
+
+
+def test_read_all_cursor(client):
+    res = client.get("/test/?size=2&cursor=")
+    assert res.status_code == 200
+    body = res.json()
+    assert body["content"] == [{"id": 1, "value": "value 1"}, {"id": 2, "value": "value 2"}]
+    assert body["size"] == 2
+    assert res.headers["Link"] == f"<http://testserver/test/?size=2&cursor={body['next_cursor']}>; rel=\"next\""
+
+    res = client.get(f"/test/?size=2&cursor={body['next_cursor']}")
+    assert res.status_code == 200
+    assert res.json() == {"content": [{"id": 3, "value": "value 3"}], "size": 2, "next_cursor": None}
+    assert res.headers["Link"] == "<http://testserver/test/?size=2&cursor=>; rel=\"first\""
+
+    res = client.get("/test/?cursor=invalid")
+    assert res.status_code == 400
+
+
+def test_read_all_filter(client):
+    res = client.get("/test/", params={"filter": "value.like:%1;id.gt:2", "sort": "id"})
+    assert res.status_code == 200
+    assert [r["value"] for r in res.json()["content"]] == ["value 1", "value 3"]
+    assert res.json()["total_elements"] == 2
+
+    res = client.get("/test/", params={"filter": "id.in:1|2", "cursor": "", "size": 1})
+    assert [r["id"] for r in res.json()["content"]] == [1]
+    assert res.json()["next_cursor"] is not None
+
+    assert client.get("/test/", params={"filter": "unknown.eq:1"}).status_code == 400
+    assert client.get("/test/", params={"filter": "id:1"}).status_code == 422
+
+
+def test_read_all_fields(client):
+    res = client.get("/test/?size=2&fields=value")
+    assert res.status_code == 200
+    assert res.json()["content"] == [{"value": "value 1"}, {"value": "value 2"}]
+
+    res = client.get("/test/1?fields=id")
+    assert res.status_code == 200
+    assert res.json() == {"id": 1}
+
+    assert client.get("/test/?fields=unknown").status_code == 400
+    assert client.get("/test/1?fields=unknown").status_code == 400
+
+
+def test_read_all_invalid_sort(client):
+    assert client.get("/test/?sort=unknown").status_code == 422
+    assert client.get("/test/?sort=value,unknown.des&cursor=").status_code == 422
+
+
+def test_export(app, client, service, mapper):
+    res = client.get("/test/export")
+    assert res.status_code == 422
+
+    class ExportEndpoint(TestEndpoint):
+        prefix = "/export"
+        enable_export = True
+        export_batch_size = 2
+
+    app.include_router(ExportEndpoint(service, mapper).router)
+    res = client.get("/export/export?sort=id.des")
+    assert res.status_code == 200
+    assert res.headers["Content-Type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in res.text.splitlines()] == [
+        {"id": 3, "value": "value 3"},
+        {"id": 2, "value": "value 2"},
+        {"id": 1, "value": "value 1"}
+    ]
+
+
+def test_read_all_page_cache(app, client, service, mapper, monkeypatch):
+    class CachedEndpoint(TestEndpoint):
+        prefix = "/cached"
+
+    service.page_cache = MemoryCacheStore()
+    app.include_router(CachedEndpoint(service, mapper).router)
+    calls = []
+    find_page = service.find_page
+
+    async def counting_find_page(*args):
+        calls.append(args)
+        return await find_page(*args)
+
+    monkeypatch.setattr(service, "find_page", counting_find_page)
+    res = client.get("/cached/?page=1&size=1")
+    assert res.status_code == 200
+    assert res.json()["content"] == [{"id": 2, "value": "value 2"}]
+    cached = client.get("/cached/?size=1&page=1")
+    assert cached.content == res.content
+    assert cached.headers["Link"] == res.headers["Link"]
+    assert len(calls) == 1
+
+    client.post("/cached/", json={"value": "value 4"})
+    res = client.get("/cached/?page=1&size=1")
+    assert res.json()["total_elements"] == 4
+    assert len(calls) == 2
+
+    # writes through the service outside of the endpoints
+    asyncio.run(service.delete_all_by_id([4]))
+    res = client.get("/cached/?page=1&size=1")
+    assert res.json()["total_elements"] == 3
+    assert len(calls) == 3
+
+
+def test_read_all_shared_page_cache(app, client, repo, mapper):
+    # two processes with their own service, sharing the page cache store
+    store = MemoryCacheStore()
+
+    class FirstEndpoint(TestEndpoint):
+        prefix = "/first"
+
+    class SecondEndpoint(TestEndpoint):
+        prefix = "/second"
+
+    app.include_router(FirstEndpoint(TestService(repo, store), mapper).router)
+    app.include_router(SecondEndpoint(TestService(repo, store), mapper).router)
+    assert client.get("/second/").json()["total_elements"] == 3
+
+    client.post("/first/", json={"value": "value 4"})
+    assert client.get("/second/").json()["total_elements"] == 4
+
+    # a failed write leaves the cached pages
+    generation = asyncio.run(store.get("TestService:page_generation"))
+    assert client.put("/first/5", json={"value": "value 5"}).status_code == 404
+    assert asyncio.run(store.get("TestService:page_generation")) == generation
+
+
 def test_post(client):
     res = client.post("/test/", json={"value": "value 4"})
     assert res.status_code == 201
@@ -45,6 +246,9 @@ def test_put(client):
     assert res.status_code == 200
     assert res.json() == {"id": 1, "value": "value 4"}
 
+    res = client.put("/test/10", json={"value": "value 4"})
+    assert res.status_code == 404
+
 
 def test_delete(client):
     res = client.delete("/test/1")
@@ -52,3 +256,200 @@ def test_delete(client):
 
     res = client.delete("/test/1")
     assert res.status_code == 404
+
+
+def test_etag(endpoint, client):
+    endpoint.enable_etag = True
+    res = client.get("/test/1")
+    assert res.status_code == 200
+    assert res.json() == {"id": 1, "value": "value 1"}
+    etag = res.headers["ETag"]
+
+    res = client.get("/test/1", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+
+    res = client.get("/test/?page=0&size=2")
+    assert res.status_code == 200
+    res = client.get("/test/?page=0&size=2", headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_code == 304
+
+    res = client.put("/test/1", json={"value": "value 4"}, headers={"If-Match": "\"outdated\""})
+    assert res.status_code == 412
+    res = client.put("/test/1", json={"value": "value 4"}, headers={"If-Match": f"W/{etag}"})
+    assert res.status_code == 412
+    res = client.put("/test/1", json={"value": "value 4"}, headers={"If-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+    res = client.delete("/test/1", headers={"If-Match": etag})
+    assert res.status_code == 412
+    res = client.get("/test/1", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+
+
+def test_version_etag(endpoint, client):
+    endpoint.enable_etag = True
+    endpoint.version_attribute = "value"
+    res = client.get("/test/1")
+    assert res.status_code == 200
+    assert res.headers["ETag"] == "\"1-value 1\""
+    assert client.get("/test/1?fields=id").headers["ETag"] == "W/\"1-value 1\""
+
+    res = client.get("/test/1", headers={"If-None-Match": "W/\"1-value 1\""})
+    assert res.status_code == 304
+
+    res = client.put("/test/1", json={"value": "value 4"}, headers={"If-Match": "W/\"1-value 1\""})
+    assert res.status_code == 412
+    res = client.put("/test/1", json={"value": "value 4"}, headers={"If-Match": "\"1-value 0\", \"1-value 1\""})
+    assert res.status_code == 200
+    assert res.headers["ETag"] == "\"1-value 4\""
+
+    res = client.delete("/test/1", headers={"If-Match": "\"1-value 1\""})
+    assert res.status_code == 412
+    res = client.delete("/test/4", headers={"If-Match": "\"4-value 4\""})
+    assert res.status_code == 404
+    res = client.delete("/test/1", headers={"If-Match": "\"1-value 4\""})
+    assert res.status_code == 204
+
+
+def test_endpoints_of_several_classes(service, mapper):
+    class StrEndpoint(CRUDEndpoints[TestReadSchema, TestCreateSchema, str]):
+        enable_export = True
+
+    int_endpoint, str_endpoint = TestEndpoint(service, mapper), StrEndpoint(service, mapper)
+    assert "export" not in [e.__name__ for e in int_endpoint.endpoints]
+    assert "export" in [e.__name__ for e in str_endpoint.endpoints]
+    assert TestEndpoint._route_functions == StrEndpoint._route_functions
+
+    def id_annotation(endpoint, path):
+        route = next(r for r in endpoint.router.routes if r.path.endswith(path) and "GET" in r.methods)
+        return inspect.signature(route.endpoint).parameters["id"].annotation
+
+    assert id_annotation(int_endpoint, "/{id}") is int
+    assert id_annotation(str_endpoint, "/{id}") is str
+    assert "__signature__" not in vars(CRUDEndpoints.read_one)
+
+
+class CountingCodec(StdlibJSONCodec):
+    def __init__(self):
+        self.dumped = 0
+        self.loaded = 0
+
+    def dumps(self, obj):
+        self.dumped += 1
+        return super().dumps(obj)
+
+    def loads(self, data):
+        self.loaded += 1
+        return super().loads(data)
+
+
+def test_codec(app, client, service, mapper):
+    counting_codec = CountingCodec()
+
+    class CodecEndpoint(TestEndpoint):
+        prefix = "/codec"
+        codec = counting_codec
+
+    app.include_router(CodecEndpoint(service, mapper).router)
+    res = client.post("/codec/", json={"value": "value 4"})
+    assert res.status_code == 201
+    assert res.json() == {"id": 4, "value": "value 4"}
+    assert (counting_codec.loaded, counting_codec.dumped) == (1, 1)
+
+    assert client.get("/codec/4").json() == {"id": 4, "value": "value 4"}
+    assert counting_codec.dumped == 2
+
+    res = client.post("/codec/", data="{", headers={"Content-Type": "application/json"})
+    assert res.status_code == 422
+
+
+def test_codec_fast_response(endpoint, client):
+    endpoint.fast_response = True
+    res = client.post("/test/", json={"value": "value 4"})
+    assert res.status_code == 201
+    assert res.json() == {"id": 4, "value": "value 4"}
+    assert res.headers["Location"] == "http://testserver/test/4"
+
+    res = client.get("/test/4")
+    assert res.status_code == 200
+    assert res.json() == {"id": 4, "value": "value 4"}
+
+    res = client.put("/test/4", json={"value": "value 5"})
+    assert res.status_code == 200
+    assert res.json() == {"id": 4, "value": "value 5"}
+
+
+def test_route_codec(service, mapper):
+    codec = CountingCodec()
+
+    class RouteCodecEndpoint(TestEndpoint):
+        @get("/count", codec=codec)
+        async def count(self):
+            return {"count": await self.service.repository.count()}
+
+    endpoint = RouteCodecEndpoint(service, mapper)
+    count_route = next(r for r in endpoint.router.routes if r.path.endswith("/count"))
+    read_route = next(r for r in endpoint.router.routes if r.path.endswith("/{id}") and "GET" in r.methods)
+    assert count_route.response_class.codec is codec
+    assert read_route.response_class.codec is TestEndpoint.codec
+
+
+def test_read_all_response_model(app, client, service, mapper):
+    class DocumentedEndpoint(TestEndpoint):
+        prefix = "/documented"
+        override_api_doc = CRUDApiDoc(read_all=ApiDoc(response_model=PageSchema[TestReadSchema]))
+
+    app.include_router(DocumentedEndpoint(service, mapper).router)
+    res = client.get("/documented/?page=1&size=2")
+    assert res.status_code == 200
+    assert res.json()["content"] == [{"id": 3, "value": "value 3"}]
+
+    res = client.get("/documented/?size=2&cursor=")
+    assert res.status_code == 200
+    assert res.json()["content"] == [{"id": 1, "value": "value 1"}, {"id": 2, "value": "value 2"}]
+    assert res.json()["next_cursor"] is not None
+
+    schema = app.openapi()["paths"]["/documented/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert [s["$ref"].rsplit("/", 1)[-1] for s in schema["anyOf"]] == ["PageSchema", "SliceSchema"]
+
+
+class AmountSchema(BaseModel):
+    id: int = Field(alias="_id")
+    amount: decimal.Decimal
+
+
+class AmountMapper(BaseMapper[TestModel, AmountSchema, TestCreateSchema]):
+    def map_to_read_schema(self, model, fields=None):
+        return AmountSchema(_id=model.id, amount=decimal.Decimal(model.id) / 4)
+
+
+def test_codec_matches_default_response(app, client, service):
+    class DefaultEndpoint(CRUDEndpoints[AmountSchema, TestCreateSchema, int]):
+        prefix = "/default"
+
+    class FastEndpoint(DefaultEndpoint):
+        prefix = "/fast"
+        fast_response = True
+
+    app.include_router(DefaultEndpoint(service, AmountMapper()).router)
+    app.include_router(FastEndpoint(service, AmountMapper()).router)
+
+    for method, path, body in [
+        ("get", "/1", None),
+        ("get", "/?page=0&size=2", None),
+        ("get", "/?size=2&cursor=", None),
+        ("put", "/2", {"value": "value 2"}),
+        ("post", "/", {"value": "value 4"}),
+    ]:
+        default = client.request(method, f"/default{path}", json=body)
+        fast = client.request(method, f"/fast{path}", json=body)
+        assert default.status_code == fast.status_code
+        if method == "post":
+            assert fast.json() == {"_id": 5, "amount": 1.25}
+            assert default.json() == {"_id": 4, "amount": 1.0}
+        else:
+            assert fast.content == default.content
+
+    assert client.get("/fast/1").json() == {"_id": 1, "amount": 0.25}
@@ -0,0 +1,68 @@
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from fastapi_starterkit.crud.mapper import BaseMapper
+from fastapi_starterkit.data.domain.document import Document, ObjectId
+from tests.conftest import TestModel, TestReadSchema
+
+
+class TestDocument(Document):
+    id: Optional[ObjectId]
+    value: str
+    secret: str = "secret"
+
+
+class TestDocumentReadSchema(BaseModel):
+    id: ObjectId
+    value: str
+
+
+class TestDocumentCreateSchema(BaseModel):
+    value: str
+
+
+class TestDocumentMapper(BaseMapper[TestDocument, TestDocumentReadSchema, TestDocumentCreateSchema]):
+    pass
+
+
+def test_map_to_read_schema(mapper):
+    schema = mapper.map_to_read_schema(TestModel(id=1, value="value 1"))
+    assert schema == TestReadSchema(id=1, value="value 1")
+
+    document_mapper = TestDocumentMapper()
+    id = ObjectId()
+    schema = document_mapper.map_to_read_schema(TestDocument(id=id, value="value 1"))
+    assert schema == TestDocumentReadSchema(id=id, value="value 1")
+
+
+def test_map_to_read_schema_without_validation(mapper):
+    mapper.validate_read_schema = False
+    schema = mapper.map_to_read_schema(TestModel(id=1, value="value 1"))
+    assert schema == TestReadSchema(id=1, value="value 1")
+
+
+def test_map_many_to_read_schema(mapper):
+    schemas = mapper.map_many_to_read_schema([TestModel(id=1, value="value 1"), TestModel(id=2, value="value 2")])
+    assert schemas == [TestReadSchema(id=1, value="value 1"), TestReadSchema(id=2, value="value 2")]
+
+
+def test_map_to_partial_read_schema(mapper):
+    schema = mapper.map_to_read_schema(TestModel(id=1, value="value 1"), ["value"])
+    assert schema.dict() == {"value": "value 1"}
+    assert type(schema) is mapper.partial_read_schema(["value"])
+
+    mapper.validate_read_schema = False
+    schemas = mapper.map_many_to_read_schema([TestModel(id=1, value="value 1")], ["id"])
+    assert [s.dict() for s in schemas] == [{"id": 1}]
+
+    with pytest.raises(ValueError):
+        mapper.partial_read_schema(["id", "unknown"])
+
+
+def test_map_to_model():
+    document = TestDocumentMapper().map_to_model(TestDocumentCreateSchema(value="value 1"))
+    assert document.id is None
+    assert document.value == "value 1"
+    assert document.secret == "secret"
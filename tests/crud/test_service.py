@@ -0,0 +1,251 @@
+import asyncio
+import contextvars
+import pickle
+from typing import Optional, Any
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from fastapi_starterkit.cache import CacheStore, MemoryCacheStore
+from fastapi_starterkit.crud.service import CachedCRUDService, EntityNotFoundError, StaleEntityError
+from fastapi_starterkit.data.domain.document import ObjectId
+from fastapi_starterkit.data.domain.filter import Filter, Criterion
+from fastapi_starterkit.data.domain.entity import Entity
+from fastapi_starterkit.data.repository.session import create_engine, SessionProvider
+from tests.conftest import TestModel, TestRepo
+from tests.data.repository.test_mongo import TestDocument, TestMongoRepository
+
+
+class FakeRedisStore(CacheStore):
+    """
+    Store serializing the values like a remote store would.
+    """
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.data.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.data[key] = pickle.dumps(value)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def clear(self):
+        self.data.clear()
+
+
+class TestCachedService(CachedCRUDService[TestDocument, ObjectId]):
+    pass
+
+
+@pytest.fixture
+def mongo_repository():
+    yield TestMongoRepository(AsyncMongoMockClient()["tests"]["tests"])
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cached_service(request, mongo_repository):
+    store = FakeRedisStore() if request.param == "redis" else None
+    yield TestCachedService(mongo_repository, store=store)
+
+
+@pytest.mark.asyncio
+async def test_find_by_id(cached_service):
+    model = await cached_service.repository.save(TestDocument(value="value 1"))
+    assert (await cached_service.find_by_id(model.id)).value == "value 1"
+    assert (await cached_service.find_by_id(model.id)).value == "value 1"
+    assert cached_service.misses == 1
+    assert cached_service.hits == 1
+
+    with pytest.raises(EntityNotFoundError):
+        await cached_service.find_by_id(ObjectId())
+
+
+@pytest.mark.asyncio
+async def test_find_by_id_coalesces_misses(cached_service, monkeypatch):
+    model = await cached_service.repository.save(TestDocument(value="value 1"))
+    calls = []
+    find_by_id = cached_service.repository.find_by_id
+
+    async def counting_find_by_id(id, fields=None, for_update=False):
+        calls.append(id)
+        await asyncio.sleep(0)
+        return await find_by_id(id, fields, for_update)
+
+    monkeypatch.setattr(cached_service.repository, "find_by_id", counting_find_by_id)
+    res = await asyncio.gather(*[cached_service.find_by_id(model.id) for _ in range(5)])
+    assert [r.value for r in res] == ["value 1"] * 5
+    assert calls == [model.id]
+
+
+@pytest.mark.asyncio
+async def test_writes_update_cache(cached_service):
+    model = await cached_service.create(TestDocument(value="value 1"))
+    assert (await cached_service.find_by_id(model.id)).value == "value 1"
+    assert cached_service.hits == 1
+
+    await cached_service.update(model.id, TestDocument(value="value 2"))
+    assert (await cached_service.find_by_id(model.id)).value == "value 2"
+    assert cached_service.hits == 2
+
+    await cached_service.delete(model.id)
+    with pytest.raises(EntityNotFoundError):
+        await cached_service.find_by_id(model.id)
+
+    models = await cached_service.save_all([TestDocument(value="value 3"), TestDocument(value="value 4")])
+    assert (await cached_service.find_by_id(models[0].id)).value == "value 3"
+    assert cached_service.misses == 1
+
+    await cached_service.delete_all_by_id([m.id for m in models])
+    with pytest.raises(EntityNotFoundError):
+        await cached_service.find_by_id(models[1].id)
+
+
+@pytest.mark.asyncio
+async def test_conditional_writes(cached_service):
+    model = await cached_service.create(TestDocument(value="value 1"))
+    stale = Filter.and_(Criterion(key="value", operator="eq", value="value 0"))
+    with pytest.raises(StaleEntityError):
+        await cached_service.update(model.id, TestDocument(value="value 2"), stale)
+    with pytest.raises(StaleEntityError):
+        await cached_service.delete(model.id, stale)
+    with pytest.raises(EntityNotFoundError):
+        await cached_service.delete(ObjectId(), stale)
+    assert (await cached_service.find_by_id(model.id)).value == "value 1"
+
+    current = Filter.and_(Criterion(key="value", operator="eq", value="value 1"))
+    assert (await cached_service.update(model.id, TestDocument(value="value 2"), current)).value == "value 2"
+    assert (await cached_service.find_by_id(model.id, for_update=True)).value == "value 2"
+
+
+@pytest.mark.asyncio
+async def test_transaction_rollback_evicts_cache(repo):
+    service = CachedCRUDService(repo)
+    with pytest.raises(RuntimeError):
+        async with service.transaction():
+            model = await service.create(TestModel(value="value 1"))
+            async with service.transaction():
+                await service.create(TestModel(value="value 2"))
+            raise RuntimeError()
+    assert len(service.store) == 0
+    assert await repo.count() == 0
+    with pytest.raises(EntityNotFoundError):
+        await service.find_by_id(model.id)
+
+    async with service.transaction():
+        model = await service.create(TestModel(value="value 1"))
+    assert (await service.find_by_id(model.id)).value == "value 1"
+    assert service.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_cache_written_after_commit(repo):
+    service = CachedCRUDService(repo, page_cache=MemoryCacheStore())
+    model = await service.create(TestModel(value="value 1"))
+    assert len(service.store) == 1
+    generation = await service.page_generation()
+
+    async with service.transaction():
+        await service.update(model.id, TestModel(value="value 2"))
+        assert len(service.store) == 0 and await service.page_generation() == generation
+        # the reads within the transaction see its writes without caching them
+        assert (await service.find_by_id(model.id)).value == "value 2"
+        assert len(service.store) == 0
+    assert await service.page_generation() != generation
+    generation = await service.page_generation()
+    assert (await service.store.get(service._key(model.id))).value == "value 2"
+
+    with pytest.raises(RuntimeError):
+        async with service.transaction():
+            await service.delete(model.id)
+            raise RuntimeError()
+    assert await service.page_generation() == generation
+    assert (await service.find_by_id(model.id)).value == "value 2"
+
+
+@pytest.fixture
+async def file_sessions(tmp_path):
+    # connections of their own, so that concurrent scopes don't see each other's uncommitted writes
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Entity.metadata.create_all)
+    sessions = SessionProvider(engine)
+    async with sessions.scope() as session:
+        session.add(TestModel(value="value 1"))
+    yield sessions
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_load_overtaken_by_write(file_sessions):
+    service = CachedCRUDService(TestRepo(file_sessions))
+    flushed, loaded, committed = asyncio.Event(), asyncio.Event(), asyncio.Event()
+
+    async def write():
+        async with file_sessions.scope():
+            await service.update(1, TestModel(value="value 2"))
+            flushed.set()
+            await loaded.wait()
+        committed.set()
+
+    async def read():
+        await flushed.wait()
+        async with file_sessions.scope():
+            assert (await service.find_by_id(1)).value == "value 1"
+            loaded.set()
+            await committed.wait()
+
+    await asyncio.gather(write(), read())
+    assert (await service.store.get(service._key(1))).value == "value 2"
+    assert (await service.find_by_id(1)).value == "value 2"
+
+
+@pytest.mark.asyncio
+async def test_shared_load_outside_of_transaction(file_sessions, monkeypatch):
+    repo = TestRepo(file_sessions)
+    service = CachedCRUDService(repo)
+    started, joined = asyncio.Event(), asyncio.Event()
+    find_by_id = repo.find_by_id
+
+    async def waiting_find_by_id(id, fields=None, for_update=False):
+        started.set()
+        await joined.wait()
+        return await find_by_id(id, fields, for_update)
+
+    monkeypatch.setattr(repo, "find_by_id", waiting_find_by_id)
+
+    async def first():
+        with pytest.raises(RuntimeError):
+            async with file_sessions.scope():
+                await repo.update_by_id(1, {"value": "uncommitted"})
+                assert (await service.find_by_id(1)).value == "value 1"
+                raise RuntimeError()
+
+    async def second():
+        await started.wait()
+        reading = asyncio.ensure_future(service.find_by_id(1))
+        await asyncio.sleep(0)
+        joined.set()
+        return await reading
+
+    assert (await asyncio.gather(first(), second()))[1].value == "value 1"
+    assert service.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_read_own_writes(file_sessions):
+    service = CachedCRUDService(TestRepo(file_sessions))
+    assert (await service.find_by_id(1)).value == "value 1"
+    async with file_sessions.scope():
+        await service.update(1, TestModel(value="value 2"))
+        assert (await service.find_by_id(1)).value == "value 2"
+        # another context reads the committed resource
+        other = contextvars.Context().run(asyncio.ensure_future, service.find_by_id(1))
+        assert (await other).value == "value 1"
+    assert (await service.find_by_id(1)).value == "value 2"
+    assert service.hits == 1
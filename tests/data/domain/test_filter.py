@@ -0,0 +1,20 @@
+from fastapi_starterkit.data.domain.filter import Operator, Filter, Criterion, LogicalOperator
+
+
+def test_operator_value_of():
+    assert Operator.value_of("eq") == Operator.EQ
+    assert Operator.value_of("LIKE") == Operator.LIKE
+    assert Operator.value_of("toto") is None
+
+
+def test_filter_creation():
+    filter = Filter.or_(Criterion.eq("key1", 1), Filter.and_(Criterion.in_("key2", [1, 2])))
+    assert filter.operator == LogicalOperator.OR
+    assert filter.criteria[0] == Criterion(key="key1", operator=Operator.EQ, value=1)
+    assert filter.criteria[1].criteria[0].value == [1, 2]
+
+
+def test_filter_range():
+    filter = Filter.range("key", 1, 2)
+    assert [(c.operator, c.value) for c in filter.criteria] == [(Operator.GTE, 1), (Operator.LTE, 2)]
+    assert [c.operator for c in Filter.range("key", end=2).criteria] == [Operator.LTE]
@@ -1,17 +1,30 @@
+import pickle
+
 import pytest
-from pydantic import ValidationError
 
-from fastapi_starterkit.data.domain.pageable import PageRequest, Page
+from fastapi_starterkit.data.domain.pageable import PageRequest, Page, Cursor, Slice, CountStrategy
 
 
 def test_page_request_validation():
-    with pytest.raises(ValidationError):
+    with pytest.raises(ValueError):
         PageRequest(page=-1, size=1)
 
-    with pytest.raises(ValidationError):
+    with pytest.raises(ValueError):
         PageRequest(page=0, size=0)
 
 
+def test_page_request_is_immutable_value():
+    page_request = PageRequest(page=1, size=10)
+    with pytest.raises(AttributeError):
+        page_request.page = 2
+    assert page_request == PageRequest(1, 10, CountStrategy.EXACT)
+    assert hash(page_request) == hash(PageRequest(1, 10))
+    assert page_request != PageRequest(1, 10, CountStrategy.NONE)
+    assert pickle.loads(pickle.dumps(page_request)) == page_request
+    assert page_request.first().next() == page_request
+    assert Page(content=[], page_request={"page": 1, "size": 10}).page_request == page_request
+
+
 def test_page_request_of_size():
     page_request = PageRequest.of_size(10)
     assert page_request.size == 10
@@ -35,6 +48,13 @@ def test_page_request_next():
     assert page_request.size == 10
 
 
+def test_page_request_keeps_count_strategy():
+    page_request = PageRequest(page=3, size=10, count=CountStrategy.NONE)
+    assert page_request.next().count == CountStrategy.NONE
+    assert page_request.previous().count == CountStrategy.NONE
+    assert page_request.first().count == CountStrategy.NONE
+
+
 def test_page_request_previous():
     page_request = PageRequest(page=3, size=10).previous()
     assert page_request.page == 2
@@ -103,6 +123,13 @@ def test_page_has_next():
     page = Page(content=[])
     assert not page.has_next()
 
+    page = Page(content=[1, 2, 3, 4, 5], page_request=PageRequest(page=1, size=5), has_more=True)
+    assert page.has_next()
+    assert page.total_pages() == 1
+
+    page = Page(content=[1, 2, 3, 4, 5], page_request=PageRequest(page=1, size=5), has_more=False)
+    assert not page.has_next()
+
 
 def test_page_has_previous():
     page = Page(content=[1, 2, 3, 4, 5], page_request=PageRequest(page=1, size=5), total_elements=25)
@@ -157,3 +184,22 @@ def test_page_previous_page_request():
 
     page = Page(content=[])
     assert page.previous_page_request() is None
+
+
+def test_cursor_encode_decode():
+    cursor = Cursor.decode(Cursor(values=["value 1", 2], id=3).encode())
+    assert cursor.values == ["value 1", 2]
+    assert cursor.id == 3
+
+    with pytest.raises(ValueError):
+        Cursor.decode("not a cursor")
+
+
+def test_slice_has_next():
+    page_slice = Slice(content=[1, 2], size=2, cursor=None, next_cursor=Cursor(id=2))
+    assert page_slice.has_next()
+    assert page_slice.is_first()
+
+    page_slice = Slice(content=[3], size=2, cursor=Cursor(id=2), next_cursor=None)
+    assert not page_slice.has_next()
+    assert not page_slice.is_first()
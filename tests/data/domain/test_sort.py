@@ -1,4 +1,6 @@
-from fastapi_starterkit.data.domain.sort import Direction, Sort
+import pytest
+
+from fastapi_starterkit.data.domain.sort import Direction, Sort, Order
 
 
 def test_direction_ascending_check():
@@ -41,13 +43,25 @@ def test_sort_creation_by_direction_and_keys():
 
 def test_sort_ascending():
     sort = Sort.by("key1", "key2", direction=Direction.DES)
-    sort.ascending()
-    assert sort.orders[0].direction == Direction.ASC
-    assert sort.orders[1].direction == Direction.ASC
+    ascending = sort.ascending()
+    assert ascending.orders[0].direction == Direction.ASC
+    assert ascending.orders[1].direction == Direction.ASC
+    assert sort.orders[0].direction == Direction.DES
 
 
 def test_sort_descending():
     sort = Sort.by("key1", "key2", direction=Direction.ASC)
-    sort.descending()
-    assert sort.orders[0].direction == Direction.DES
-    assert sort.orders[1].direction == Direction.DES
+    descending = sort.descending()
+    assert descending.orders[0].direction == Direction.DES
+    assert descending.orders[1].direction == Direction.DES
+    assert sort.orders[0].direction == Direction.ASC
+
+
+def test_sort_is_immutable_value():
+    sort = Sort.by("key1", "key2")
+    with pytest.raises(AttributeError):
+        sort.orders = ()
+    with pytest.raises(AttributeError):
+        sort.orders[0].direction = Direction.DES
+    assert sort == Sort(orders=[Order(key="key1", direction=Direction.ASC), {"key": "key2", "direction": 1}])
+    assert len({sort, Sort.by("key1", "key2"), sort.descending()}) == 2
@@ -4,8 +4,10 @@ import pytest
 from mongomock_motor import AsyncMongoMockClient
 
 from fastapi_starterkit.data.domain.document import Document, ObjectId
-from fastapi_starterkit.data.domain.pageable import PageRequest
+from fastapi_starterkit.data.domain.filter import Filter, Criterion
+from fastapi_starterkit.data.domain.pageable import PageRequest, Cursor, CountStrategy
 from fastapi_starterkit.data.domain.sort import Sort, Direction
+from fastapi_starterkit.data.repository.core import UnindexedSortPolicy
 from fastapi_starterkit.data.repository.mongo import MongoRepository
 
 
@@ -53,8 +55,9 @@ async def test_delete_all_by_id(collection, mongo_repository):
 @pytest.mark.asyncio
 async def test_delete_by_id(collection, mongo_repository):
     object_ids = await load_data(collection)
-    await mongo_repository.delete_by_id(object_ids[0])
+    assert await mongo_repository.delete_by_id(object_ids[0])
     assert await mongo_repository.count() == 2
+    assert not await mongo_repository.delete_by_id(object_ids[0])
 
 
 @pytest.mark.asyncio
@@ -73,6 +76,13 @@ async def test_find_all(collection, mongo_repository):
     assert [r.value for r in res] == ["value 3", "value 2", "value 1"]
 
 
+@pytest.mark.asyncio
+async def test_stream_all(collection, mongo_repository):
+    await load_data(collection)
+    res = [m async for m in mongo_repository.stream_all(Sort.by("value", direction=Direction.DES), batch_size=2)]
+    assert [r.value for r in res] == ["value 3", "value 2", "value 1"]
+
+
 @pytest.mark.asyncio
 async def test_find_page(collection, mongo_repository):
     await load_data(collection)
@@ -81,6 +91,91 @@ async def test_find_page(collection, mongo_repository):
     assert res.total_elements == 3
 
 
+@pytest.mark.asyncio
+async def test_find_page_count_strategy(collection, mongo_repository):
+    await load_data(collection)
+    res = await mongo_repository.find_page(PageRequest(page=0, size=2, count=CountStrategy.ESTIMATED))
+    assert res.total_elements == 3
+
+    res = await mongo_repository.find_page(PageRequest(page=0, size=2, count=CountStrategy.NONE))
+    assert len(res.content) == 2
+    assert res.total_elements is None
+    assert res.has_next()
+
+    res = await mongo_repository.find_page(PageRequest(page=0, size=2, count=CountStrategy.HAS_NEXT))
+    assert len(res.content) == 2
+    assert res.has_next()
+
+    res = await mongo_repository.find_page(PageRequest(page=1, size=2, count=CountStrategy.HAS_NEXT))
+    assert len(res.content) == 1
+    assert not res.has_next()
+
+
+@pytest.mark.asyncio
+async def test_find_slice(collection, mongo_repository):
+    object_ids = await load_data(collection)
+    res = await mongo_repository.find_slice(None, 2)
+    assert [r.id for r in res.content] == object_ids[0:2]
+    assert res.has_next()
+
+    res = await mongo_repository.find_slice(Cursor.decode(res.next_cursor.encode()), 2)
+    assert [r.id for r in res.content] == object_ids[2:]
+    assert not res.has_next()
+
+    sort = Sort.by("value", direction=Direction.DES)
+    res = await mongo_repository.find_slice(None, 1, sort)
+    res = await mongo_repository.find_slice(Cursor.decode(res.next_cursor.encode()), 1, sort)
+    assert [r.value for r in res.content] == ["value 2"]
+
+
+@pytest.mark.asyncio
+async def test_find_with_filter(collection, mongo_repository):
+    object_ids = await load_data(collection)
+    filter = Filter.or_(Criterion.eq("value", "value 1"), Criterion.eq("id", str(object_ids[2])))
+    assert await mongo_repository.count(filter) == 2
+    res = await mongo_repository.find_page(PageRequest.of_size(1), filter=filter)
+    assert [r.value for r in res.content] == ["value 1"]
+    assert res.total_elements == 2
+
+    res = await mongo_repository.find_slice(None, 1, filter=Filter.and_(Criterion.like("value", "%2")))
+    assert [r.value for r in res.content] == ["value 2"]
+    assert not res.has_next()
+
+    res = await mongo_repository.find_all(filter=Filter.range("value", "value 2", "value 3"))
+    assert [r.value for r in res] == ["value 2", "value 3"]
+
+    with pytest.raises(ValueError):
+        await mongo_repository.find_all(filter=Filter.and_(Criterion.eq("unknown", 1)))
+
+
+@pytest.mark.asyncio
+async def test_find_with_fields(collection, mongo_repository):
+    object_ids = await load_data(collection)
+    res = await mongo_repository.find_page(PageRequest.of_size(2), fields=[])
+    assert [r.id for r in res.content] == object_ids[0:2]
+    assert "value" not in res.content[0].__dict__
+
+    res = await mongo_repository.find_slice(None, 1, Sort.by("value"), fields=["id"])
+    assert res.next_cursor.values == ["value 1"]
+
+    assert "value" not in (await mongo_repository.find_by_id(object_ids[0], fields=["id"])).__dict__
+    assert await mongo_repository.find_by_id(ObjectId(), fields=["id"]) is None
+
+
+@pytest.mark.asyncio
+async def test_validate_sort(collection, mongo_repository):
+    await load_data(collection)
+    assert mongo_repository.sortable_keys == {"id", "value"}
+    with pytest.raises(ValueError):
+        await mongo_repository.find_all(Sort.by("unknown"))
+
+    mongo_repository.unindexed_sort = UnindexedSortPolicy.REFUSE
+    with pytest.raises(ValueError):
+        await mongo_repository.find_all(Sort.by("value"))
+    mongo_repository.indexed_keys = frozenset(["id", "value"])
+    assert len(await mongo_repository.find_all(Sort.by("value"))) == 3
+
+
 @pytest.mark.asyncio
 async def test_find_all_by_id(collection, mongo_repository):
     object_ids = await load_data(collection)
@@ -112,6 +207,9 @@ async def test_save(mongo_repository):
     assert res.value == "value 2"
     assert len(await mongo_repository.find_all()) == 1
 
+    assert await mongo_repository.save(TestDocument(id=ObjectId(), value="value 3")) is None
+    assert len(await mongo_repository.find_all()) == 1
+
 
 @pytest.mark.asyncio
 async def test_save_all(mongo_repository):
@@ -121,8 +219,26 @@ async def test_save_all(mongo_repository):
         TestDocument(value="value 3")
     ])
     assert len(res) == 3
+    assert all(r.id for r in res)
     assert len(await mongo_repository.find_all()) == 3
 
+    res[0].value = "value 4"
+    res = await mongo_repository.save_all([res[0], TestDocument(value="value 5")], chunk_size=1)
+    assert [r.value for r in res] == ["value 4", "value 5"]
+    assert (await mongo_repository.find_by_id(res[0].id)).value == "value 4"
+    assert len(await mongo_repository.find_all()) == 4
+
+
+@pytest.mark.asyncio
+async def test_update_by_id(collection, mongo_repository):
+    object_ids = await load_data(collection)
+    res = await mongo_repository.update_by_id(object_ids[0], {"value": "value 4"})
+    assert res.id == object_ids[0]
+    assert res.value == "value 4"
+    assert (await mongo_repository.find_by_id(object_ids[0])).value == "value 4"
+
+    assert await mongo_repository.update_by_id(ObjectId(), {"value": "value 4"}) is None
+
 
 async def load_data(collection):
     return [
@@ -130,3 +246,126 @@ async def load_data(collection):
         (await collection.insert_one({"value": "value 2"})).inserted_id,
         (await collection.insert_one({"value": "value 3"})).inserted_id
     ]
+
+
+@pytest.mark.asyncio
+async def test_read_collection(collection):
+    read_collection = AsyncMongoMockClient()["tests"]["tests"]
+    await read_collection.insert_one({"value": "replica 1"})
+    repo = TestMongoRepository(collection, read_collection)
+    repo.sticky_window = 0
+    saved = await repo.save(TestDocument(value="value 1"))
+    assert await repo.count() == 1
+    assert [d.value for d in await repo.find_all()] == ["replica 1"]
+    assert await repo.find_by_id(saved.id) is None
+
+    repo.sticky_window = 60
+    await repo.update_by_id(saved.id, {"value": "value 2"})
+    assert (await repo.find_by_id(saved.id)).value == "value 2"
+    assert [d.value for d in (await repo.find_page(PageRequest.of_size(10))).content] == ["value 2"]
+
+
+class FakeTransaction:
+    def __init__(self, events: list):
+        self.events = events
+
+    async def __aenter__(self):
+        self.events.append("start")
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.events.append("abort" if exc_type else "commit")
+
+
+class FakeSession:
+    def __init__(self, events: list):
+        self.events = events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.events.append("end")
+
+    def start_transaction(self):
+        return FakeTransaction(self.events)
+
+
+@pytest.fixture
+def session_events(collection, monkeypatch):
+    """
+    Fakes the client sessions mongomock lacks, and records the collection calls with the session they were given.
+    """
+    events = []
+
+    async def start_session():
+        return FakeSession(events)
+
+    def record(name):
+        method = getattr(collection, name)
+
+        async def call(*args, session=None, **kwargs):
+            events.append((name, isinstance(session, FakeSession)))
+            return await method(*args, **kwargs)
+        return call
+
+    monkeypatch.setattr(collection.database.client, "start_session", start_session)
+    for name in ("count_documents", "estimated_document_count", "delete_many", "drop"):
+        monkeypatch.setattr(collection, name, record(name))
+    yield events
+
+
+@pytest.mark.asyncio
+async def test_transaction_after_commit(collection, mongo_repository, session_events):
+    async def callback():
+        session_events.append("callback")
+
+    async with mongo_repository.transaction():
+        await mongo_repository.after_commit(callback)
+        assert "callback" not in session_events
+    assert session_events == ["start", "commit", "end", "callback"]
+
+
+@pytest.mark.asyncio
+async def test_transaction_rollback(collection, mongo_repository, session_events):
+    async def callback():
+        session_events.append("callback")
+
+    with pytest.raises(RuntimeError):
+        async with mongo_repository.transaction():
+            await mongo_repository.after_commit(callback)
+            raise RuntimeError()
+    assert session_events == ["start", "abort", "end"]
+
+    await mongo_repository.after_commit(callback)
+    assert session_events[-1] == "callback"
+
+
+@pytest.mark.asyncio
+async def test_nested_transaction(collection, mongo_repository, session_events):
+    async def callback():
+        session_events.append("callback")
+
+    async with mongo_repository.transaction():
+        async with mongo_repository.transaction():
+            await mongo_repository.after_commit(callback)
+        assert session_events == ["start"]
+    assert session_events == ["start", "commit", "end", "callback"]
+
+
+@pytest.mark.asyncio
+async def test_transaction_session(collection, mongo_repository, session_events):
+    await load_data(collection)
+    async with mongo_repository.transaction():
+        assert await mongo_repository.count() == 3
+        await mongo_repository.delete_all()
+    assert await mongo_repository.count() == 0
+    await mongo_repository.delete_all()
+    assert session_events == [
+        "start",
+        ("count_documents", True),
+        ("delete_many", True),
+        "commit",
+        "end",
+        ("estimated_document_count", False),
+        ("drop", False)
+    ]
@@ -0,0 +1,105 @@
+import pytest
+from sqlalchemy.pool import NullPool
+
+from fastapi_starterkit.data.repository.session import create_engine
+from tests.conftest import TestModel, TestRepo
+
+
+def test_create_engine():
+    engine = create_engine("sqlite+aiosqlite:///test.db", pool_size=5, max_overflow=2)
+    assert isinstance(engine.pool, NullPool)
+    assert engine.pool._pre_ping
+
+
+@pytest.mark.asyncio
+async def test_scope(repo, sessions):
+    assert sessions.current is None
+    async with sessions.scope() as session:
+        assert sessions.current is session
+        async with sessions.session() as current:
+            assert current is session
+        await repo.save(TestModel(value="value 1"))
+        await repo.save(TestModel(value="value 2"))
+        assert await repo.count() == 2
+    assert sessions.current is None
+    assert await repo.count() == 2
+
+
+@pytest.mark.asyncio
+async def test_scope_rollback(repo, sessions):
+    with pytest.raises(RuntimeError):
+        async with sessions.scope():
+            await repo.save(TestModel(value="value 1"))
+            raise RuntimeError()
+    assert sessions.current is None
+    assert await repo.count() == 0
+
+
+@pytest.mark.asyncio
+async def test_session_outside_scope(repo, sessions):
+    async with sessions.session() as session:
+        assert sessions.current is session
+    assert sessions.current is None
+
+
+@pytest.mark.asyncio
+async def test_read_replicas(replicated_sessions):
+    repo = TestRepo(replicated_sessions(0))
+    assert await repo.count() == 1
+    assert (await repo.find_by_id(1)).value == "replica 0"
+
+    async with repo.sessions.scope():
+        assert await repo.count() == 1
+        saved = await repo.save(TestModel(value="value 4"))
+        assert saved.id == 4
+        assert await repo.count() == 4
+    assert await repo.count() == 1
+
+    await repo.delete_by_id(4)
+    assert await repo.count() == 1
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes(replicated_sessions):
+    repo = TestRepo(replicated_sessions(60))
+    assert await repo.count() == 1
+    await repo.update_by_id(1, {"value": "value 1"})
+    assert (await repo.find_by_id(1)).value == "value 1"
+    assert await repo.count() == 3
+
+
+@pytest.mark.asyncio
+async def test_locking_read_from_primary(replicated_sessions):
+    repo = TestRepo(replicated_sessions(0))
+    async with repo.sessions.scope():
+        assert (await repo.find_by_id(1, for_update=True)).value == "primary 0"
+    assert (await repo.find_by_id(1, ["value"], for_update=True)).value == "primary 0"
+    assert (await repo.find_by_id(1)).value == "replica 0"
+
+
+@pytest.mark.asyncio
+async def test_after_commit(sessions):
+    called = []
+
+    async def callback(value):
+        called.append(value)
+
+    await sessions.after_commit(lambda: callback(0))
+    assert called == [0]
+
+    async with sessions.scope():
+        await sessions.after_commit(lambda: callback(1))
+        with pytest.raises(RuntimeError):
+            async with sessions.transaction():
+                await sessions.after_commit(lambda: callback(2))
+                raise RuntimeError()
+        async with sessions.transaction():
+            await sessions.after_commit(lambda: callback(3))
+        assert called == [0]
+    assert called == [0, 1, 3]
+
+    with pytest.raises(RuntimeError):
+        async with sessions.scope():
+            await sessions.after_commit(lambda: callback(4))
+            raise RuntimeError()
+    assert called == [0, 1, 3]
@@ -1,96 +1,344 @@
+from types import SimpleNamespace
+
 import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
 
-from fastapi_starterkit.data.domain.pageable import PageRequest
+from fastapi_starterkit.data.domain.filter import Filter, Criterion
+from fastapi_starterkit.data.domain.pageable import PageRequest, Cursor, CountStrategy
 from fastapi_starterkit.data.domain.sort import Sort, Direction
-from tests.conftest import TestModel
+from fastapi_starterkit.data.repository.core import UnindexedSortPolicy
+from tests.conftest import TestModel, TestRepo
+
+
+@pytest.mark.asyncio
+async def test_count(repo, persist_models):
+    assert await repo.count() == 3
 
 
 @pytest.mark.asyncio
-async def test_count(repo, persist_models, session):
-    assert await repo.count(session) == 3
+async def test_delete_all(repo, persist_models):
+    await repo.delete_all()
+    assert await repo.count() == 0
 
 
 @pytest.mark.asyncio
-async def test_delete_all(repo, persist_models, session):
-    await repo.delete_all(session)
-    assert await repo.count(session) == 0
+async def test_delete_all_by_id(repo, persist_models):
+    await repo.delete_all_by_id((1, 2))
+    assert await repo.count() == 1
 
 
 @pytest.mark.asyncio
-async def test_delete_all_by_id(repo, persist_models, session):
-    await repo.delete_all_by_id(session, (1, 2))
-    assert await repo.count(session) == 1
+async def test_delete_by_id(repo, persist_models):
+    assert await repo.delete_by_id(1)
+    assert await repo.count() == 2
+    assert not await repo.delete_by_id(1)
 
 
 @pytest.mark.asyncio
-async def test_delete_by_id(repo, persist_models, session):
-    await repo.delete_by_id(session, 1)
-    assert await repo.count(session) == 2
+async def test_delete_by_id_with_filter(repo, persist_models):
+    assert not await repo.delete_by_id(1, Filter.and_(Criterion(key="value", operator="eq", value="value 2")))
+    assert await repo.delete_by_id(1, Filter.and_(Criterion(key="value", operator="eq", value="value 1")))
+    assert await repo.count() == 2
 
 
 @pytest.mark.asyncio
-async def test_exists_by_id(repo, persist_models, session):
-    assert await repo.exists_by_id(session, 1)
-    assert not await repo.exists_by_id(session, 4)
+async def test_exists_by_id(repo, persist_models):
+    assert await repo.exists_by_id(1)
+    assert not await repo.exists_by_id(4)
 
 
 @pytest.mark.asyncio
-async def test_find_all(repo, persist_models, session):
-    assert len(await repo.find_all(session)) == 3
+async def test_find_all(repo, persist_models):
+    assert len(await repo.find_all()) == 3
 
-    res = await repo.find_all(session, sort=Sort.by("value", direction=Direction.DES))
+    res = await repo.find_all(sort=Sort.by("value", direction=Direction.DES))
     assert [r.value for r in res] == ["value 3", "value 2", "value 1"]
 
 
 @pytest.mark.asyncio
-async def test_find_page(repo, persist_models, session):
-    res = await repo.find_page(session, PageRequest.of_size(2))
+async def test_stream_all(repo, persist_models):
+    res = [m async for m in repo.stream_all(Sort.by("value", direction=Direction.DES), batch_size=2)]
+    assert [r.value for r in res] == ["value 3", "value 2", "value 1"]
+
+
+@pytest.mark.asyncio
+async def test_find_page(repo, persist_models):
+    res = await repo.find_page(PageRequest.of_size(2))
+    assert len(res.content) == 2
+    assert res.total_elements == 3
+
+    res = await repo.find_page(PageRequest(page=0, size=2), Sort.by("value", direction=Direction.DES))
+    assert [r.value for r in res.content] == ["value 3", "value 2"]
+
+
+@pytest.mark.asyncio
+async def test_find_page_count_strategy(repo, persist_models):
+    res = await repo.find_page(PageRequest(page=0, size=2, count=CountStrategy.ESTIMATED))
+    assert res.total_elements == 3
+
+    res = await repo.find_page(PageRequest(page=0, size=2, count=CountStrategy.NONE))
     assert len(res.content) == 2
+    assert res.total_elements is None
+    assert res.has_next()
+
+    res = await repo.find_page(PageRequest(page=0, size=2, count=CountStrategy.HAS_NEXT))
+    assert len(res.content) == 2
+    assert res.total_elements is None
+    assert res.has_next()
+
+    res = await repo.find_page(PageRequest(page=1, size=2, count=CountStrategy.HAS_NEXT))
+    assert len(res.content) == 1
+    assert not res.has_next()
+
+
+@pytest.mark.asyncio
+async def test_find_page_count_without_order_by(repo, engine, persist_models):
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    res = await repo.find_page(PageRequest(page=0, size=2), Sort.by("value", direction=Direction.DES))
+    assert [r.value for r in res.content] == ["value 3", "value 2"]
     assert res.total_elements == 3
+    count = next(s for s in statements if "count(" in s)
+    assert "ORDER BY" not in count
+
+
+@pytest.mark.asyncio
+async def test_find_page_window_count(sessions, persist_models):
+    repo = TestRepo(sessions)
+    repo.window_count = True
+    res = await repo.find_page(PageRequest(page=1, size=2), Sort.by("value", direction=Direction.DES))
+    assert [r.value for r in res.content] == ["value 1"]
+    assert res.total_elements == 3
+
+    res = await repo.find_page(PageRequest(page=5, size=2))
+    assert len(res.content) == 0
+    assert res.total_elements == 3
+
+
+@pytest.mark.asyncio
+async def test_find_slice(repo, persist_models):
+    res = await repo.find_slice(None, 2)
+    assert [r.id for r in res.content] == [1, 2]
+    assert res.has_next()
+
+    res = await repo.find_slice(Cursor.decode(res.next_cursor.encode()), 2)
+    assert [r.id for r in res.content] == [3]
+    assert not res.has_next()
+
+    sort = Sort.by("value", direction=Direction.DES)
+    res = await repo.find_slice(None, 1, sort)
+    res = await repo.find_slice(res.next_cursor, 1, sort)
+    assert [r.value for r in res.content] == ["value 2"]
+
+    with pytest.raises(ValueError):
+        await repo.find_slice(Cursor(id=1), 1, sort)
+
+
+@pytest.mark.asyncio
+async def test_find_with_filter(repo, persist_models):
+    filter = Filter.or_(Criterion.eq("value", "value 1"), Filter.range("id", start="3"))
+    assert await repo.count(filter) == 2
+    res = await repo.find_page(PageRequest.of_size(1), filter=filter)
+    assert [r.value for r in res.content] == ["value 1"]
+    assert res.total_elements == 2
+
+    res = await repo.find_slice(None, 1, filter=Filter.and_(Criterion.like("value", "%2")))
+    assert [r.value for r in res.content] == ["value 2"]
+    assert not res.has_next()
+
+    res = await repo.find_all(filter=Filter.and_(Criterion.in_("id", ["1", "2"])))
+    assert len(res) == 2
+
+    with pytest.raises(ValueError):
+        await repo.find_all(filter=Filter.and_(Criterion.eq("unknown", 1)))
+    with pytest.raises(ValueError):
+        await repo.find_all(filter=Filter.and_(Criterion.eq("id", "one")))
 
 
 @pytest.mark.asyncio
-async def test_find_all_by_id(repo, persist_models, session):
-    assert len(await repo.find_all_by_id(session, [1, 2])) == 2
+async def test_find_with_fields(repo, persist_models):
+    res = await repo.find_page(PageRequest.of_size(2), fields=[])
+    assert [r.id for r in res.content] == [1, 2]
+    assert "value" not in res.content[0].__dict__
+
+    res = await repo.find_slice(None, 1, Sort.by("value"), fields=["id"])
+    assert res.next_cursor.values == ["value 1"]
+
+    assert "value" not in (await repo.find_by_id(1, fields=["id"])).__dict__
+    assert await repo.find_by_id(4, fields=["id"]) is None
+
+
+def test_sortable_keys(repo):
+    assert repo.sortable_keys == {"id", "value"}
+    assert repo.indexed_keys == {"id"}
+
+
+@pytest.mark.asyncio
+async def test_validate_sort(repo, persist_models, caplog):
+    with pytest.raises(ValueError):
+        await repo.find_all(Sort.by("unknown"))
+    with pytest.raises(ValueError):
+        await repo.find_slice(None, 1, Sort.by("unknown"))
+
+    repo.unindexed_sort = UnindexedSortPolicy.WARN
+    assert len(await repo.find_all(Sort.by("value"))) == 3
+    assert "No index supports sorting TestRepo by value" in caplog.text
+
+    repo.unindexed_sort = UnindexedSortPolicy.REFUSE
+    with pytest.raises(ValueError):
+        await repo.find_page(PageRequest.of_size(1), Sort.by("value"))
+    assert len(await repo.find_all(Sort.by("id", "value"))) == 3
+
+
+@pytest.mark.asyncio
+async def test_find_all_by_id(repo, persist_models):
+    assert len(await repo.find_all_by_id([1, 2])) == 2
 
 
 @pytest.mark.asyncio
-async def test_find_by_id(repo, persist_models, session):
-    assert (await repo.find_by_id(session, 1)).value == "value 1"
-    assert await repo.find_by_id(session, 4) is None
+async def test_find_by_id(repo, persist_models):
+    assert (await repo.find_by_id(1)).value == "value 1"
+    assert await repo.find_by_id(4) is None
 
 
 @pytest.mark.asyncio
-async def test_save_unexpected_type(repo, session):
+async def test_save_unexpected_type(repo):
     with pytest.raises(ValueError):
-        await repo.save(session, 1)
+        await repo.save(1)
 
 
 @pytest.mark.asyncio
-async def test_save(repo, session):
-    res = await repo.save(session, TestModel(value="value 1"))
+async def test_save(repo):
+    res = await repo.save(TestModel(value="value 1"))
     assert res.id == 1
     assert res.value == "value 1"
-    assert len(await repo.find_all(session)) == 1
+    assert len(await repo.find_all()) == 1
 
     res.value = "value 2"
-    res = await repo.save(session, res)
+    res = await repo.save(res)
     assert res.value == "value 2"
-    assert len(await repo.find_all(session)) == 1
+    assert len(await repo.find_all()) == 1
 
-    res = await repo.save(session, TestModel(value="value 3"))
+    res = await repo.save(TestModel(value="value 3"))
     assert res.id == 2
     assert res.value == "value 3"
-    assert len(await repo.find_all(session)) == 2
+    assert len(await repo.find_all()) == 2
 
 
 @pytest.mark.asyncio
-async def test_save_all(repo, persist_models, session):
-    model = await repo.find_by_id(session, 1)
+async def test_save_all(repo, persist_models):
+    model = await repo.find_by_id(1)
     model.value = "value 4"
-    res = await repo.save_all(session, [
+    res = await repo.save_all([
         model,
         TestModel(value="value 5")
     ])
     assert len(res) == 2
-    assert len(await repo.find_all(session)) == 4
+    assert len(await repo.find_all()) == 4
+
+
+@pytest.mark.asyncio
+async def test_update_by_id(repo, persist_models):
+    res = await repo.update_by_id(1, {"value": "value 4"})
+    assert res.id == 1
+    assert res.value == "value 4"
+    assert (await repo.find_by_id(1)).value == "value 4"
+
+    assert await repo.update_by_id(4, {"value": "value 4"}) is None
+
+
+@pytest.mark.asyncio
+async def test_update_by_id_with_filter(repo, persist_models):
+    version = Filter.and_(Criterion(key="value", operator="in", value=["value 0", "value 1"]))
+    assert (await repo.update_by_id(1, {"value": "value 4"}, version)).value == "value 4"
+    assert await repo.update_by_id(1, {"value": "value 5"}, version) is None
+    assert (await repo.find_by_id(1)).value == "value 4"
+
+
+@pytest.mark.asyncio
+async def test_save_all_chunked(repo, persist_models):
+    res = await repo.save_all([TestModel(value=f"value {i}") for i in range(4, 9)], chunk_size=2)
+    assert [r.id for r in res] == [4, 5, 6, 7, 8]
+    assert await repo.count() == 8
+
+
+@pytest.mark.asyncio
+async def test_transaction(repo, persist_models, sessions):
+    async with repo.transaction():
+        await repo.save(TestModel(value="value 4"))
+        with pytest.raises(RuntimeError):
+            async with repo.transaction():
+                await repo.delete_all()
+                assert await repo.count() == 0
+                raise RuntimeError()
+        assert await repo.count() == 4
+        await repo.delete_by_id(1)
+    assert sessions.current is None
+    assert await repo.count() == 3
+
+    with pytest.raises(RuntimeError):
+        async with repo.transaction():
+            await repo.save_all([TestModel(value="value 5"), TestModel(value="value 6")])
+            raise RuntimeError()
+    assert await repo.count() == 3
+
+
+def test_upsert_statements(repo):
+    models = [TestModel(value="value 4"), TestModel(id=1, value="value 1"), TestModel(value=None)]
+    inserts, new_rows = repo._upsert_statements(models, [4, 1, 5])
+    compiled = inserts.compile(dialect=postgresql.dialect())
+    assert "ON CONFLICT (id) DO UPDATE SET value = excluded.value" in str(compiled)
+    assert "RETURNING testmodel.id, testmodel.value" in str(compiled)
+    assert list(compiled.params.values()) == [4, "value 4", 1, "value 1"]
+    # the column defaults apply to the unset values of new entities
+    assert new_rows.compile(dialect=postgresql.dialect()).params == {"id_m0": 5}
+
+
+@pytest.mark.asyncio
+async def test_next_ids(repo, monkeypatch):
+    statements = []
+
+    async with repo.sessions.session() as session:
+        async def execute(stmt):
+            statements.append(str(stmt.compile(dialect=postgresql.dialect())))
+            return SimpleNamespace(scalars=lambda: SimpleNamespace(all=lambda: [4, 5]))
+
+        monkeypatch.setattr(session, "execute", execute)
+        assert await repo._next_ids(session, 0) == []
+        assert await repo._next_ids(session, 2) == [4, 5]
+    assert statements == [
+        "SELECT nextval(pg_get_serial_sequence(%(pg_get_serial_sequence_1)s, %(pg_get_serial_sequence_2)s)) AS "
+        "nextval_1 \nFROM generate_series(%(generate_series_1)s, %(generate_series_2)s)"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_upsert_returning(repo, persist_models, monkeypatch):
+    existing = await repo.find_by_id(1)
+    existing.value = "value 1"
+    models = [TestModel(value="value 4"), existing, TestModel(value="value 5")]
+    table = TestModel.__table__
+
+    async def next_ids(session, count):
+        assert count == 2
+        return [4, 5]
+
+    async with repo.sessions.session() as session:
+        async def execute(stmt):
+            # rows returned in another order than the values
+            return SimpleNamespace(all=lambda: [
+                SimpleNamespace(_mapping={table.c.id: 5, table.c.value: "value 5"}),
+                SimpleNamespace(_mapping={table.c.id: 1, table.c.value: "value 1"}),
+                SimpleNamespace(_mapping={table.c.id: 4, table.c.value: "value 4"}),
+            ])
+
+        monkeypatch.setattr(session, "execute", execute)
+        monkeypatch.setattr(repo, "_next_ids", next_ids)
+        saved = await repo._upsert_returning(session, models)
+        assert all(s is m for s, m in zip(saved, models))
+        assert [(m.id, m.value) for m in saved] == [(4, "value 4"), (1, "value 1"), (5, "value 5")]
+        assert all(m in session for m in saved)
+
+        with pytest.raises(ValueError):
+            await repo._upsert_returning(session, [TestModel(id=1, value="a"), TestModel(id=1, value="b")])
@@ -0,0 +1,60 @@
+import time
+
+import pytest
+
+from fastapi_starterkit.cache import MemoryCacheStore
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_store():
+    store = MemoryCacheStore()
+    assert await store.get("key") is None
+
+    await store.set("key", "value")
+    assert await store.get("key") == "value"
+
+    await store.delete("key")
+    assert await store.get("key") is None
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_store_eviction():
+    store = MemoryCacheStore(max_size=2)
+    await store.set("key 1", "value 1")
+    await store.set("key 2", "value 2")
+    await store.get("key 1")
+    await store.set("key 3", "value 3")
+    assert len(store) == 2
+    assert await store.get("key 1") == "value 1"
+    assert await store.get("key 2") is None
+    assert await store.get("key 3") == "value 3"
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_store_max_bytes():
+    store = MemoryCacheStore(max_bytes=10)
+    await store.set("key 1", b"12345")
+    await store.set("key 2", (b"1234", "5"))
+    assert store.bytes == 10
+    await store.set("key 3", b"1")
+    assert await store.get("key 1") is None
+    assert store.bytes == 6
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_store_ttl(monkeypatch):
+    store = MemoryCacheStore(ttl=10)
+    await store.set("key 1", "value 1")
+    await store.set("key 2", "value 2", ttl=30)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 20)
+    assert await store.get("key 1") is None
+    assert await store.get("key 2") == "value 2"
+
+
+@pytest.mark.asyncio
+async def test_memory_cache_store_clear():
+    store = MemoryCacheStore()
+    await store.set("key", "value")
+    await store.clear()
+    assert len(store) == 0
@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_MODULES = ["sqlalchemy", "motor", "pymongo", "bson"]
+# self import time of the package modules, in microseconds, far above the usual ~30ms to stay stable on slow runners
+IMPORT_TIME_BUDGET = 250_000
+
+
+def import_times(module: str) -> dict:
+    """
+    Returns the self import time in microseconds of every module loaded by importing the given module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True, check=True
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_time)
+    return times
+
+
+@pytest.mark.parametrize("module", [
+    "fastapi_starterkit.crud.endpoints",
+    "fastapi_starterkit.data.domain",
+    "fastapi_starterkit.data.repository",
+    "fastapi_starterkit.main",
+])
+def test_backends_are_not_imported(module):
+    times = import_times(module)
+    assert [m for m in BACKEND_MODULES if m in times] == []
+
+
+def test_import_time_budget():
+    times = import_times("fastapi_starterkit.crud.endpoints")
+    assert sum(t for m, t in times.items() if m.startswith("fastapi_starterkit")) < IMPORT_TIME_BUDGET
+
+
+def test_lazy_attributes():
+    import fastapi_starterkit.data.domain as domain
+    assert "Sort" in dir(domain)
+    assert domain.Sort.__module__ == "fastapi_starterkit.data.domain.sort"
+    assert "Sort" in vars(domain)
+    with pytest.raises(AttributeError):
+        domain.Unknown
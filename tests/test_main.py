@@ -0,0 +1,12 @@
+from fastapi.testclient import TestClient
+
+from fastapi_starterkit.main import create_app
+
+
+def test_create_app(tmp_path):
+    for i in range(2):
+        with TestClient(create_app(f"sqlite+aiosqlite:///{tmp_path}/demo_{i}.db")) as client:
+            res = client.post("/test/", json={"value": "value 1"})
+            assert res.status_code == 201
+            assert res.json() == {"id": 1, "value": "value 1"}
+            assert client.get("/test/").json()["total_elements"] == 1
@@ -0,0 +1,23 @@
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+from fastapi_starterkit.web.codec import codec_response_class, codec_route_class
+from fastapi_starterkit.web.encoder import StdlibJSONCodec
+
+
+class Schema(BaseModel):
+    id: int
+
+
+def test_codec_response_schema():
+    codec = StdlibJSONCodec()
+    app = FastAPI()
+    app.router.add_api_route(
+        "/",
+        lambda: Schema(id=1),
+        response_model=Schema,
+        response_class=codec_response_class(codec),
+        route_class_override=codec_route_class(codec)
+    )
+    response = app.openapi()["paths"]["/"]["get"]["responses"]["200"]
+    assert response["content"]["application/json"]["schema"] == {"$ref": "#/components/schemas/Schema"}
@@ -1,13 +1,18 @@
 import pytest
+from fastapi import HTTPException
 
-from fastapi_starterkit.web.dependencies import pageable_parameters, sort_parameters
+from fastapi_starterkit.data.domain.filter import Operator, LogicalOperator, Filter
+from fastapi_starterkit.data.domain.pageable import CountStrategy
+from fastapi_starterkit.web.dependencies import pageable_parameters, sort_parameters, cursor_parameters, \
+    filter_parameters, fields_parameters
 
 
 @pytest.mark.asyncio
 async def test_pageable_parameters():
-    page_request = await pageable_parameters(0, 10)
+    page_request = await pageable_parameters(0, 10, CountStrategy.EXACT)
     assert page_request.page == 0
     assert page_request.size == 10
+    assert page_request.count == CountStrategy.EXACT
 
 
 @pytest.mark.asyncio
@@ -26,3 +31,41 @@ async def test_sort_parameters():
     assert sort.orders[0].direction.is_ascending()
     assert sort.orders[1].key == "value"
     assert sort.orders[1].direction.is_descending()
+    assert sort is await sort_parameters("id,value.des")
+
+    with pytest.raises(HTTPException):
+        await sort_parameters("id.up")
+
+
+@pytest.mark.asyncio
+async def test_cursor_parameters():
+    assert await cursor_parameters(None) is None
+    assert await cursor_parameters("") == ""
+
+
+@pytest.mark.asyncio
+async def test_filter_parameters():
+    assert await filter_parameters(None) is None
+
+    filter = await filter_parameters("value.like:foo%,id.gte:10")
+    assert filter.operator == LogicalOperator.AND
+    assert [(c.key, c.operator, c.value) for c in filter.criteria] == [
+        ("value", Operator.LIKE, "foo%"), ("id", Operator.GTE, "10")
+    ]
+
+    filter = await filter_parameters("value.eq:a:b;id.in:1|2")
+    assert filter.operator == LogicalOperator.OR
+    assert all(isinstance(f, Filter) for f in filter.criteria)
+    assert filter.criteria[0].criteria[0].value == "a:b"
+    assert filter.criteria[1].criteria[0].value == ["1", "2"]
+
+    for invalid in ["value", "value:a", "value.toto:a", ".eq:a"]:
+        with pytest.raises(HTTPException):
+            await filter_parameters(invalid)
+
+
+@pytest.mark.asyncio
+async def test_fields_parameters():
+    assert await fields_parameters(None) is None
+    assert await fields_parameters(" ,") is None
+    assert await fields_parameters("id, value") == ["id", "value"]
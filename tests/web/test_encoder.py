@@ -0,0 +1,87 @@
+import datetime
+import decimal
+import json
+
+import pytest
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+
+from fastapi_starterkit.web import encoder
+from fastapi_starterkit.web.encoder import json_dumps, StdlibJSONCodec, OrjsonCodec, default_codec
+
+
+class Schema(BaseModel):
+    id: int
+    at: datetime.datetime
+    amount: decimal.Decimal
+
+
+class AliasedSchema(BaseModel):
+    id: int = Field(alias="_id")
+    amount: decimal.Decimal
+    at: datetime.datetime
+
+    class Config:
+        json_encoders = {datetime.datetime: lambda v: v.timestamp()}
+
+
+@pytest.fixture(params=[True, False], ids=["orjson", "stdlib"])
+def use_orjson(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(encoder, "orjson", None)
+    yield request.param
+
+
+def test_json_dumps(use_orjson):
+    id = ObjectId()
+    content = {
+        "content": [Schema(id=1, at=datetime.datetime(2022, 1, 1, 12), amount=decimal.Decimal("1.5"))],
+        "id": id
+    }
+    assert json.loads(json_dumps(content)) == {
+        "content": [{"id": 1, "at": "2022-01-01T12:00:00", "amount": 1.5}],
+        "id": str(id)
+    }
+
+
+def test_json_dumps_unexpected_type(use_orjson):
+    with pytest.raises(TypeError):
+        json_dumps(object())
+
+
+@pytest.mark.parametrize("codec", [StdlibJSONCodec(), OrjsonCodec()], ids=["stdlib", "orjson"])
+def test_codec(codec):
+    id = ObjectId()
+    content = {
+        1: Schema(id=1, at=datetime.datetime(2022, 1, 1, 12, tzinfo=datetime.timezone.utc), amount="1.5"),
+        "id": id,
+        "values": {"a"}
+    }
+    assert codec.loads(codec.dumps(content)) == {
+        "1": {"id": 1, "at": "2022-01-01T12:00:00+00:00", "amount": 1.5},
+        "id": str(id),
+        "values": ["a"]
+    }
+    with pytest.raises(json.JSONDecodeError):
+        codec.loads(b"{")
+
+
+def test_default_codec(use_orjson):
+    assert isinstance(default_codec(), OrjsonCodec if use_orjson else StdlibJSONCodec)
+
+
+@pytest.mark.parametrize("codec", [StdlibJSONCodec(), OrjsonCodec()], ids=["stdlib", "orjson"])
+def test_codec_matches_jsonable_encoder(codec):
+    content = {
+        "schema": Schema(id=1, at=datetime.datetime(2022, 1, 1, 12), amount="1.50"),
+        "aliased": AliasedSchema(
+            _id=1, at=datetime.datetime(2022, 1, 1, 12, tzinfo=datetime.timezone.utc), amount="10"
+        ),
+        "amounts": [decimal.Decimal("0.1"), decimal.Decimal("2")]
+    }
+    assert codec.loads(codec.dumps(content)) == jsonable_encoder(content) == {
+        "schema": {"id": 1, "at": "2022-01-01T12:00:00", "amount": 1.5},
+        "aliased": {"_id": 1, "amount": 10, "at": 1641038400.0},
+        "amounts": [0.1, 2]
+    }
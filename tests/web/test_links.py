@@ -0,0 +1,47 @@
+from starlette.datastructures import URL
+
+from fastapi_starterkit.data.domain.pageable import Page, PageRequest, Slice, Cursor
+from fastapi_starterkit.web.links import PageInfo, QueryLinks, page_links, slice_links
+
+
+def test_page_info():
+    page_info = PageInfo.of(Page(content=[1], page_request=PageRequest(page=1, size=1), total_elements=3))
+    assert page_info == PageInfo(number=1, size=1, total_pages=3, total_elements=3, has_next=True)
+
+    page_info = PageInfo.of(Page(content=[1], page_request=PageRequest(page=1, size=1), has_more=False))
+    assert page_info == PageInfo(number=1, size=1, total_pages=None, total_elements=None, has_next=False)
+
+
+def test_query_links():
+    links = QueryLinks(URL("http://host/path?size=10&page=1&filter=id.gt:1&page=3"), "page")
+    assert links.uri("2") == "http://host/path?size=10&page=2&filter=id.gt:1"
+    assert links.link("0", "first") == "<http://host/path?size=10&page=0&filter=id.gt:1>; rel=\"first\""
+
+    links = QueryLinks(URL("http://host/path?sort=page=1"), "page")
+    assert links.uri("2") == "http://host/path?sort=page=1&page=2"
+
+    links = QueryLinks(URL("http://host/path"), "cursor")
+    assert links.uri("a/b") == "http://host/path?cursor=a%2Fb"
+
+
+def test_page_links():
+    url = URL("http://host/path?page=1&size=1")
+    page = Page(content=[1], page_request=PageRequest(page=1, size=1), total_elements=3)
+    assert page_links(PageInfo.of(page), url) == (
+        "<http://host/path?page=2&size=1>; rel=\"next\", "
+        "<http://host/path?page=0&size=1>; rel=\"prev\", "
+        "<http://host/path?page=0&size=1>; rel=\"first\", "
+        "<http://host/path?page=2&size=1>; rel=\"last\""
+    )
+
+    page = Page(content=[1], page_request=PageRequest(page=0, size=1), total_elements=1)
+    assert page_links(PageInfo.of(page), url) == ""
+
+
+def test_slice_links():
+    url = URL("http://host/path?cursor=&size=1")
+    page_slice = Slice(content=[1], size=1, cursor=None, next_cursor=Cursor(values=[], id=1))
+    assert slice_links(page_slice, url) == f"<http://host/path?cursor={Cursor(id=1).encode()}&size=1>; rel=\"next\""
+
+    page_slice = Slice(content=[1], size=1, cursor=Cursor(id=1), next_cursor=None)
+    assert slice_links(page_slice, url) == "<http://host/path?cursor=&size=1>; rel=\"first\""
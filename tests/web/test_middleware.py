@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from fastapi_starterkit.web.middleware import SessionScopeMiddleware, ReadYourWritesMiddleware
+from tests.conftest import TestModel, TestRepo
+
+
+def test_session_scope_middleware(repo, sessions, persist_models):
+    app = FastAPI()
+    app.add_middleware(SessionScopeMiddleware, sessions=sessions)
+
+    committed = []
+
+    @app.post("/{status}")
+    async def create(status: int):
+        await repo.after_commit(lambda: asyncio.sleep(0, committed.append(status)))
+        first = await repo.save(TestModel(value="value 4"))
+        second = await repo.save(TestModel(value="value 5"))
+        assert sessions.current is not None
+        assert first in sessions.current and second in sessions.current
+        if status >= 400:
+            raise HTTPException(status_code=status)
+        return {"ids": [first.id, second.id]}
+
+    @app.get("/")
+    async def count():
+        return await repo.count()
+
+    client = TestClient(app)
+    assert client.post("/409").status_code == 409
+    assert client.get("/").json() == 3
+    assert committed == []
+    assert client.post("/201").json() == {"ids": [4, 5]}
+    assert client.get("/").json() == 5
+    assert committed == [201]
+
+
+def test_read_your_writes_middleware(replicated_sessions):
+    repo = TestRepo(replicated_sessions(60))
+    app = FastAPI()
+    app.add_middleware(SessionScopeMiddleware, sessions=repo.sessions)
+    app.add_middleware(ReadYourWritesMiddleware, sticky_window=60)
+
+    @app.post("/")
+    async def create():
+        await repo.save(TestModel(value="value 4"))
+        return await repo.count()
+
+    @app.get("/")
+    async def count():
+        return await repo.count()
+
+    client = TestClient(app)
+    assert client.get("/").json() == 1
+    assert "set-cookie" not in client.get("/").headers
+    res = client.post("/")
+    assert res.json() == 4
+    assert "primary_until=" in res.headers["set-cookie"]
+    assert client.get("/").json() == 4
+    assert TestClient(app).get("/").json() == 1
+    assert TestClient(app).get("/", cookies={"primary_until": "invalid"}).json() == 1
+
+
+def test_read_your_writes_middleware_caps_cookie(replicated_sessions):
+    repo = TestRepo(replicated_sessions(0))
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware, sticky_window=0)
+
+    @app.get("/")
+    async def count():
+        return await repo.count()
+
+    client = TestClient(app)
+    assert client.get("/", cookies={"primary_until": f"{time.time() + 3600}"}).json() == 1
+    assert client.get("/", cookies={"primary_until": "inf"}).json() == 1